@@ -1,6 +1,10 @@
-from dataclasses import dataclass
+import json
+import os
+import sys
+from array import array
+from dataclasses import dataclass, field, replace
 from collections import defaultdict
-from typing import List, Dict
+from typing import List, Dict, Iterator, Optional, Set, Tuple, Union
 
 
 @dataclass
@@ -9,6 +13,9 @@ class UDNode:
     Stores all UD fields under their canonical names according
     to the CoNLL-U format.
     """
+    __slots__ = ('ID', 'FORM', 'LEMMA', 'UPOS', 'XPOS',
+                 'FEATS', 'HEAD', 'DEPREL', 'DEPS', 'MISC')
+
     # Word index, integer starting at 1 for each new sentence; may be
     # a range for multiword tokens; may be a decimal number for empty
     # nodes (decimal numbers can be lower than 1 but must be greater
@@ -33,12 +40,13 @@ class UDNode:
     MISC: str  # Any other annotation.
 
     def __str__(self):
-        fields = list(self.__dataclass_fields__)
-        return '\t'.join(self.__dict__[f] for f in fields)
+        return '\t'.join(getattr(self, f) for f in self.__slots__)
 
 
 @dataclass
 class UDEdge:
+    __slots__ = ('head', 'relation', 'directionality')
+
     head: str
     relation: str
     directionality: str
@@ -52,6 +60,19 @@ class UDTree:
     nodes: Dict[str, UDNode]  # Nodes with UD attributes indexed by keys.
     # Lists of edges indexed by keys.
     graph: Dict[str, List[UDEdge]]
+    # Keys of nodes and edge lists that are shared with another tree
+    # after copy() and have to be cloned before they are modified.
+    _shared_nodes: Set[str] = field(
+        default_factory=set, init=False, repr=False, compare=False)
+    _shared_edges: Set[str] = field(
+        default_factory=set, init=False, repr=False, compare=False)
+    # Positions of the paired up and down edges of every dependent
+    # in its own and its head's edge list, and base relations (without
+    # subtypes) of all nodes. Both are built on first use.
+    _edge_positions: Optional[Dict[str, Tuple[int, int]]] = field(
+        default=None, init=False, repr=False, compare=False)
+    _base_relations: Optional[Dict[str, str]] = field(
+        default=None, init=False, repr=False, compare=False)
 
     def __str__(self):
         lines = self.id_lines + [str(self.nodes[key]) for key in self.keys]
@@ -68,6 +89,258 @@ class UDTree:
         # A well-formed UD tree has a virtual root with a single child.
         return self.get_node_children('0')[0]
 
+    def copy(self) -> 'UDTree':
+        """
+        Returns a copy-on-write copy of the tree. Nodes and edge lists
+        are shared between the two trees until one of them requests
+        them through get_mutable_node or get_mutable_edges, so copies
+        that are never modified cost only a few dict copies.
+        """
+        other = UDTree(self.id_lines[:], self.keys, dict(self.nodes),
+                       defaultdict(list, self.graph))
+        self._shared_nodes.update(self.nodes)
+        self._shared_edges.update(self.graph)
+        other._shared_nodes.update(self.nodes)
+        other._shared_edges.update(self.graph)
+        # Relabelling never changes the positions of edges.
+        other._edge_positions = self._edge_positions
+        if self._base_relations is not None:
+            other._base_relations = dict(self._base_relations)
+        return other
+
+    def get_mutable_node(self, node_idx) -> UDNode:
+        """Returns the node under node_idx, cloning it first if it is shared."""
+        if node_idx in self._shared_nodes:
+            self._shared_nodes.discard(node_idx)
+            self.nodes[node_idx] = replace(self.nodes[node_idx])
+        return self.nodes[node_idx]
+
+    def get_mutable_edges(self, node_idx) -> List[UDEdge]:
+        """Returns the edges of node_idx, cloning them first if they are shared."""
+        if node_idx in self._shared_edges:
+            self._shared_edges.discard(node_idx)
+            self.graph[node_idx] = [replace(edge) for edge in self.graph[node_idx]]
+        return self.graph[node_idx]
+
+    def get_edge_positions(self) -> Dict[str, Tuple[int, int]]:
+        """
+        Returns a dict mapping each dependent to the position of its
+        upward edge in its own edge list and of the matching downward
+        edge in the edge list of its head.
+        """
+        if self._edge_positions is None:
+            up, down = {}, {}
+            for node_idx, edges in self.graph.items():
+                for i, edge in enumerate(edges):
+                    if edge.directionality == 'up':
+                        up[node_idx] = i
+                    else:
+                        down[edge.head] = i
+            self._edge_positions = {
+                node_idx: (i, down[node_idx]) for node_idx, i in up.items()
+            }
+        return self._edge_positions
+
+    def get_base_relations(self) -> Dict[str, str]:
+        """Returns the DEPREL of every node with its subtype stripped."""
+        if self._base_relations is None:
+            self._base_relations = {
+                key: self.nodes[key].DEPREL.split(':')[0]
+                for key in self.keys
+            }
+        return self._base_relations
+
+    def set_relation(self, node_idx, relation: str):
+        """
+        Sets the dependency relation of a node together with the pair
+        of edges connecting it to its head.
+        """
+        self.get_mutable_node(node_idx).DEPREL = relation
+        positions = self.get_edge_positions().get(node_idx)
+        if positions is not None:
+            up, down = positions
+            edges = self.get_mutable_edges(node_idx)
+            edges[up].relation = relation
+            self.get_mutable_edges(edges[up].head)[down].relation = relation
+        if self._base_relations is not None:
+            self._base_relations[node_idx] = relation.split(':')[0]
+
+
+class CompactUDTree:
+    """
+    A memory-lean alternative to UDTree for holding whole treebanks.
+    The ten CoNLL-U fields are stored column-wise, tokens are addressed
+    by integer row numbers and dependency structure is kept as CSR-style
+    child adjacency arrays instead of paired up/down UDEdges. Row 0 of
+    the adjacency is the virtual root, row i + 1 is the token in row i.
+    """
+    __slots__ = ('id_lines', 'columns', '_rows',
+                 '_child_offsets', '_children')
+
+    FIELDS = UDNode.__slots__
+
+    def __init__(self, id_lines: List[str], columns: Tuple[List[str], ...]):
+        self.id_lines = id_lines
+        self.columns = columns
+        keys = columns[0]
+        self._rows = {key: i for i, key in enumerate(keys)}
+        # Count the children of every head, then place each child
+        # in its head's slot, keeping the original token order.
+        heads = []
+        counts = [0] * (len(keys) + 2)
+        for i, head in enumerate(columns[self.FIELDS.index('HEAD')]):
+            if head == '_':
+                continue
+            row = 0 if head == '0' else self._rows[head] + 1
+            heads.append((row, i))
+            counts[row + 1] += 1
+        for row in range(1, len(counts)):
+            counts[row] += counts[row - 1]
+        self._child_offsets = array('i', counts)
+        self._children = array('i', bytes(4 * len(heads)))
+        positions = counts[:-1]
+        for row, i in heads:
+            self._children[positions[row]] = i
+            positions[row] += 1
+
+    @property
+    def keys(self) -> List[str]:
+        return self.columns[0]
+
+    def __len__(self):
+        return len(self.columns[0])
+
+    def __str__(self):
+        lines = self.id_lines + ['\t'.join(row) for row in zip(*self.columns)]
+        return '\n'.join(lines)
+
+    def get_node(self, node_idx) -> UDNode:
+        i = self._rows[node_idx]
+        return UDNode(*(column[i] for column in self.columns))
+
+    def get_sentence(self) -> str:
+        return ' '.join(form.lower() for form in self.columns[1])
+
+    def get_node_children(self, node_idx) -> List[str]:
+        row = 0 if node_idx == '0' else self._rows[node_idx] + 1
+        start, end = self._child_offsets[row], self._child_offsets[row + 1]
+        keys = self.columns[0]
+        return [keys[i] for i in self._children[start:end]]
+
+    def get_real_root(self) -> str:
+        # A well-formed UD tree has a virtual root with a single child.
+        return self.get_node_children('0')[0]
+
+    def to_udtree(self) -> 'UDTree':
+        return UDTree(*conllu2graph(str(self)))
+
+
+@dataclass
+class TokenAlignment:
+    """
+    Alignment between an external tokenization of a sentence, with
+    tokens numbered from 1, and the words of a UD tree.
+    """
+    token2keys: Dict[int, List[str]]
+    key2tokens: Dict[str, List[int]]
+
+    def get_key(self, position) -> Optional[str]:
+        """
+        Returns the key of the UD word that is aligned one-to-one with
+        the token at position; None if there is no such word.
+        """
+        keys = self.token2keys.get(position, ())
+        if len(keys) == 1 and len(self.key2tokens[keys[0]]) == 1:
+            return keys[0]
+        return None
+
+
+def _get_word_segments(ud_tree: 'UDTree') -> List[Tuple[str, List[str]]]:
+    # Returns (surface text, keys of words) for every word of the tree.
+    # A multiword token whose words do not spell out its form, like
+    # Spanish 'del' = 'de' + 'el', becomes a single segment.
+    segments = []
+    keys = ud_tree.keys
+    i = 0
+    while i < len(keys):
+        key = keys[i]
+        i += 1
+        if '.' in key:  # Empty nodes have no surface form.
+            continue
+        if '-' not in key:
+            segments.append((ud_tree.nodes[key].FORM, [key]))
+            continue
+        last = int(key.split('-')[1])
+        words = []
+        while i < len(keys) and '-' not in keys[i] and ('.' in keys[i] or int(keys[i]) <= last):
+            if '.' not in keys[i]:
+                words.append(keys[i])
+            i += 1
+        form = ud_tree.nodes[key].FORM
+        if ''.join(ud_tree.nodes[word].FORM for word in words) == form:
+            segments.extend((ud_tree.nodes[word].FORM, [word]) for word in words)
+        else:
+            segments.append((form, words))
+    return segments
+
+
+def align_tokens(ud_tree: 'UDTree', tokens: List[str]) -> TokenAlignment:
+    """
+    Aligns tokens to the words of ud_tree by character offsets in the
+    sentence with whitespace removed, so repeated word forms and
+    differences in tokenization are handled by position. If the two
+    texts diverge, only the tokens before the divergence are aligned.
+    """
+    segments = _get_word_segments(ud_tree)
+    texts = [[''.join(form.split()) for form, _ in segments],
+             [''.join(token.split()) for token in tokens]]
+    ud_text, token_text = (''.join(text) for text in texts)
+    limit = 0
+    for ud_char, token_char in zip(ud_text, token_text):
+        if ud_char != token_char:
+            break
+        limit += 1
+
+    token2keys = {}
+    key2tokens = {}
+    i = j = 0
+    ud_start = token_start = 0
+    while i < len(segments) and j < len(tokens):
+        ud_end = ud_start + len(texts[0][i])
+        token_end = token_start + len(texts[1][j])
+        if ud_end > limit or token_end > limit:
+            break
+        if max(ud_start, token_start) < min(ud_end, token_end):
+            for key in segments[i][1]:
+                token2keys.setdefault(j + 1, []).append(key)
+                key2tokens.setdefault(key, []).append(j + 1)
+        if ud_end <= token_end:
+            i += 1
+            ud_start = ud_end
+        if token_end <= ud_end:
+            j += 1
+            token_start = token_end
+    return TokenAlignment(token2keys, key2tokens)
+
+
+def conllu2columns(record):
+    """
+    Converts a CoNLL-U sentence to a tuple of (id_lines, columns),
+    which may be used by a CompactUDTree constructor. Field values
+    are interned, so that repeated tags and relations are stored once.
+    """
+    id_lines = []
+    columns = tuple([] for _ in CompactUDTree.FIELDS)
+    for line in record.splitlines():
+        if line.startswith("#"):
+            id_lines.append(line)
+            continue
+        fields = line.strip("\n").split("\t")
+        assert len(fields) == 10
+        for column, value in zip(columns, fields):
+            column.append(sys.intern(value))
+    return id_lines, columns
+
 
 def conllu2graph(record):
     """
@@ -107,11 +380,134 @@ def conllu2graph(record):
     return id_lines, keys, nodes, graph
 
 
-def conllu2trees(path):
+def iter_conllu_blocks(path) -> Iterator[str]:
+    """
+    Reads a CoNLL-U file line by line and yields the text of each
+    sentence block without the separating blank lines. CRLF line
+    endings and runs of several blank lines are tolerated.
+    """
     with open(path, 'r', encoding='utf-8') as inp:
-        txt = inp.read().strip()
-        blocks = txt.split('\n\n')
-    return [UDTree(*conllu2graph(block)) for block in blocks]
+        block = []
+        for line in inp:
+            line = line.rstrip('\r\n')
+            if line.strip():
+                block.append(line)
+            elif block:
+                yield '\n'.join(block)
+                block = []
+        if block:
+            yield '\n'.join(block)
+
+
+def iter_conllu_trees(path, compact=False) -> Iterator[Union[UDTree, CompactUDTree]]:
+    """
+    Lazily converts a CoNLL-U file to UDTrees, one sentence block
+    at a time, so that only the current block is held in memory.
+    If compact is True, CompactUDTrees are produced instead.
+    """
+    for block in iter_conllu_blocks(path):
+        if compact:
+            yield CompactUDTree(*conllu2columns(block))
+        else:
+            yield UDTree(*conllu2graph(block))
+
+
+def conllu2trees(path, compact=False) -> List[Union[UDTree, CompactUDTree]]:
+    return list(iter_conllu_trees(path, compact=compact))
+
+
+SENT_ID_PREFIX = '# sent_id = '
+INDEX_SUFFIX = '.idx.json'
+
+
+@dataclass
+class ConlluIndex:
+    """
+    Maps sent_ids to the byte offset and length of their blocks
+    in a CoNLL-U file, so that single trees can be parsed on demand.
+    """
+    path: str
+    offsets: Dict[str, Tuple[int, int]]
+
+    def __contains__(self, sent_id) -> bool:
+        return sent_id in self.offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def get_block(self, sent_id) -> str:
+        offset, length = self.offsets[sent_id]
+        with open(self.path, 'rb') as inp:
+            inp.seek(offset)
+            return inp.read(length).decode('utf-8')
+
+    def get_tree(self, sent_id) -> UDTree:
+        return UDTree(*conllu2graph(self.get_block(sent_id)))
+
+
+def build_conllu_index(path) -> Dict[str, Tuple[int, int]]:
+    """
+    Scans a CoNLL-U file once and returns a dict mapping the sent_id
+    of each block to its (byte offset, byte length). Blocks without
+    a sent_id comment are not indexed.
+    """
+    offsets = {}
+    prefix = SENT_ID_PREFIX.encode('utf-8')
+    start = end = None
+    sent_id = None
+    position = 0
+    with open(path, 'rb') as inp:
+        for line in inp:
+            if line.strip():
+                if start is None:
+                    start = position
+                if line.startswith(prefix):
+                    sent_id = line[len(prefix):].strip().decode('utf-8')
+                end = position + len(line.rstrip(b'\r\n'))
+            elif start is not None:
+                if sent_id is not None:
+                    offsets[sent_id] = (start, end - start)
+                start = sent_id = None
+            position += len(line)
+    if start is not None and sent_id is not None:
+        offsets[sent_id] = (start, end - start)
+    return offsets
+
+
+def load_conllu_index(path, index_path=None) -> ConlluIndex:
+    """
+    Returns the sent_id index of a CoNLL-U file. The index is stored
+    in a sidecar file (path + INDEX_SUFFIX by default) and reused
+    while the mtime and size of the CoNLL-U file are unchanged;
+    otherwise it is rebuilt and the sidecar is rewritten.
+    """
+    path = os.fspath(path)
+    if index_path is None:
+        index_path = path + INDEX_SUFFIX
+    stat = os.stat(path)
+    try:
+        with open(index_path, 'r', encoding='utf-8') as inp:
+            stored = json.load(inp)
+        if stored['mtime'] == stat.st_mtime_ns and stored['size'] == stat.st_size:
+            return ConlluIndex(path, {
+                sent_id: tuple(span)
+                for sent_id, span in stored['offsets'].items()
+            })
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        # A missing or corrupt sidecar is rebuilt.
+        pass
+    offsets = build_conllu_index(path)
+    try:
+        with open(index_path, 'w', encoding='utf-8') as out:
+            json.dump({
+                'mtime': stat.st_mtime_ns,
+                'size': stat.st_size,
+                'offsets': offsets
+            }, out)
+    except OSError:
+        # A read-only location only costs us the rebuild next time.
+        pass
+    return ConlluIndex(path, offsets)
 
 
 if __name__ == '__main__':
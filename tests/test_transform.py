@@ -0,0 +1,219 @@
+import io
+import os
+import shutil
+from itertools import islice
+
+import pytest
+
+import UDLib
+import transform
+from ucca import core, layer0, layer1, textutil
+from ucca.constructions import extract_candidates
+from ucca.textutil import Attr
+from .test_udlib import PASSIVE
+
+"""Tests relabeling, annotation and transform_corpus."""
+
+PARSED_DIR = os.path.join(os.path.dirname(__file__), "..", "parsed", "UD_English-EWT_text_dev")
+CONLLU_PATH = os.path.join(os.path.dirname(__file__), "..", "conllu", "en_ewt-ud-dev.conllu")
+
+
+def test_transform_corpus_duplicate_sent_ids(tmp_path):
+    parses = sorted(os.listdir(PARSED_DIR))[:2]
+    sent_ids = [transform.get_passage_sent_id(parse) for parse in parses]
+    blocks = [block for block in UDLib.iter_conllu_blocks(CONLLU_PATH)
+              if transform.get_block_sent_id(block) in sent_ids]
+    conllu_path = tmp_path / "ud.conllu"
+    conllu_path.write_text("".join(block + "\n\n" for block in blocks), encoding="utf-8")
+    ucca_dir = tmp_path / "parsed"
+    ucca_dir.mkdir()
+    # Two paragraphs of the first sentence, then the second sentence
+    shutil.copy(os.path.join(PARSED_DIR, parses[0]), ucca_dir / (sent_ids[0] + "_0.xml"))
+    shutil.copy(os.path.join(PARSED_DIR, parses[0]), ucca_dir / (sent_ids[0] + "_1.xml"))
+    shutil.copy(os.path.join(PARSED_DIR, parses[1]), ucca_dir / parses[1])
+    output_path = tmp_path / "out.conllu"
+    log = io.StringIO()
+    transform.transform_corpus(ucca_dir, conllu_path, output_path, workers=1, log=log)
+    assert "Skipping" in log.getvalue()
+    assert "2 sentences" in log.getvalue()
+    written = [transform.get_block_sent_id(block) for block in UDLib.iter_conllu_blocks(str(output_path))]
+    assert written == [transform.get_block_sent_id(block) for block in blocks]
+
+
+def _swap_labels_full_scan(ud_tree, replacement_dict):
+    # swap_labels before set_relation: every node and every edge is mapped
+    for node_key in ud_tree.keys:
+        node = ud_tree.nodes[node_key]
+        node.DEPREL = replacement_dict.get(node.DEPREL.split(':')[0], node.DEPREL)
+        for edge in ud_tree.graph[node_key]:
+            edge.relation = replacement_dict.get(edge.relation.split(':')[0], edge.relation)
+
+
+def _replace_label_full_scan(ud_tree, node_id, new_label):
+    # replace_label before set_relation: the head's edges are searched for the downward edge
+    ud_tree.nodes[node_id].DEPREL = new_label
+    for edge in ud_tree.graph[node_id]:
+        if edge.directionality == 'up':
+            edge.relation = new_label
+            if edge.head != '0':
+                for parent_edge in ud_tree.graph[edge.head]:
+                    if parent_edge.directionality == 'down' and parent_edge.head == node_id:
+                        parent_edge.relation = new_label
+                        break
+
+
+def _edges(tree):
+    # The full scans left the virtual root's edge as it was, so it is left out
+    return {key: edges for key, edges in tree.graph.items() if edges and key != '0'}
+
+
+def _assert_root_edge(tree):
+    assert [edge.relation for edge in tree.graph['0']] == [tree.nodes[tree.get_real_root()].DEPREL]
+
+
+def _ewt_trees(n=200):
+    return list(islice(UDLib.iter_conllu_trees(CONLLU_PATH), n))
+
+
+@pytest.mark.parametrize("replacement_dict", (
+        {relation: "A" for relation in ["nsubj", "obj", "iobj", "obl"]},
+        {"nsubj": "obj", "obj": "nsubj", "root": "dep", "punct": "punct:x"}))
+def test_swap_labels(replacement_dict):
+    for tree, expected in zip(_ewt_trees(), _ewt_trees()):
+        tree.get_base_relations()
+        transform.swap_labels(tree, replacement_dict)
+        _swap_labels_full_scan(expected, replacement_dict)
+        assert str(tree) == str(expected)
+        assert _edges(tree) == _edges(expected)
+        _assert_root_edge(tree)
+        assert tree.get_base_relations() == UDLib.UDTree(*UDLib.conllu2graph(str(tree))).get_base_relations()
+
+
+def test_replace_label():
+    for tree, expected in zip(_ewt_trees(), _ewt_trees()):
+        for key in tree.keys:
+            if tree.nodes[key].HEAD != '_':
+                transform.replace_label(tree, key, "obl:npmod")
+                _replace_label_full_scan(expected, key, "obl:npmod")
+                assert str(tree) == str(expected)
+                assert _edges(tree) == _edges(expected)
+                _assert_root_edge(tree)
+
+
+# Sentences of the EWT dev set whose parses convert nominal predicates
+CHANGED = ["answers-20111108075111AAmNees_ans-0003", "answers-20111108084633AAzZD8i_ans-0001",
+           "email-enronsent00_02-0014", "email-enronsent19_02-0051", "email-enronsent20_02-0010"]
+
+
+@pytest.fixture(scope="module")
+def corpus(tmp_path_factory):
+    """A small treebank with changed and unchanged parsed sentences, and a sentence with no parse"""
+    tmp_path = tmp_path_factory.mktemp("corpus")
+    parses = {transform.get_passage_sent_id(parse): parse for parse in sorted(os.listdir(PARSED_DIR))}
+    sent_ids = set(CHANGED + [sent_id for sent_id in parses if sent_id not in CHANGED][:3])
+    blocks, unparsed = [], []
+    for block in UDLib.iter_conllu_blocks(CONLLU_PATH):
+        sent_id = transform.get_block_sent_id(block)
+        if sent_id in sent_ids:
+            blocks.append(block)
+        elif sent_id not in parses and not unparsed:
+            unparsed.append(sent_id)
+            blocks.append(block)
+    conllu_path = tmp_path / "ud.conllu"
+    conllu_path.write_text("".join(block + "\n\n" for block in blocks), encoding="utf-8")
+    ucca_dir = tmp_path / "parsed"
+    ucca_dir.mkdir()
+    for sent_id in sent_ids:
+        shutil.copy(os.path.join(PARSED_DIR, parses[sent_id]), ucca_dir / parses[sent_id])
+    assert len(blocks) == len(sent_ids) + 1
+    return str(ucca_dir), str(conllu_path), blocks
+
+
+def _main(corpus, tmp_path, name, *args):
+    """Runs the command line interface and returns the blocks written"""
+    ucca_dir, conllu_path, _ = corpus
+    output_path = str(tmp_path / name)
+    transform.main([ucca_dir, conllu_path, output_path] + list(args))
+    return list(UDLib.iter_conllu_blocks(output_path))
+
+
+def _collapsed(blocks, input_blocks, collapsed_label):
+    """Collapses the participants of the changed blocks"""
+    for block, input_block in zip(blocks, input_blocks):
+        if block != input_block:
+            tree = UDLib.UDTree(*UDLib.conllu2graph(block))
+            transform.collapse_participants(tree, collapsed_label)
+            block = str(tree)
+        yield block
+
+
+def _relations(block):
+    return {line.split("\t")[7] for line in block.splitlines() if not line.startswith("#")}
+
+
+def test_main_workers(corpus, tmp_path):
+    input_blocks = corpus[2]
+    expected = _main(corpus, tmp_path, "1.conllu", "-w", "1", "-c", "2", "-r", str(tmp_path / "1.diff"))
+    assert [transform.get_block_sent_id(block) for block in expected] == \
+        [transform.get_block_sent_id(block) for block in input_blocks]
+    assert sorted(transform.get_block_sent_id(block) for block, input_block in zip(expected, input_blocks)
+                  if block != input_block) == CHANGED
+    report = (tmp_path / "1.diff").read_text(encoding="utf-8")
+    assert sorted(line.split()[3] for line in report.splitlines() if line.startswith("# sent_id = ")) == CHANGED
+    for name, args in (("2", ("-w", "2", "-c", "2")), ("3s", ("-w", "3", "-c", "1", "-s"))):
+        assert _main(corpus, tmp_path, name + ".conllu", *args, "-r", str(tmp_path / (name + ".diff"))) == expected
+        assert (tmp_path / (name + ".diff")).read_text(encoding="utf-8") == report
+
+
+def test_main_collapse(corpus, tmp_path):
+    input_blocks = corpus[2]
+    for label, args in (("A", ()), ("obl", ("-l", "obl"))):
+        collapsed = _main(corpus, tmp_path, label + ".conllu", "-w", "1", *args)
+        not_collapsed = _main(corpus, tmp_path, label + "-no-collapse.conllu", "-w", "1", "--no-collapse", *args)
+        assert not_collapsed != collapsed
+        assert list(_collapsed(not_collapsed, input_blocks, label)) == collapsed
+        changed = [block for block, input_block in zip(collapsed, input_blocks) if block != input_block]
+        assert all(label in _relations(block) for block in changed)
+        assert all(("A" in _relations(block)) == (label == "A") for block in changed)
+
+
+def _passage(ID, texts):
+    """A passage with one scene: [A The cat] [F was] [P seen.]"""
+    p = core.Passage(ID)
+    l0 = layer0.Layer0(p)
+    l1 = layer1.Layer1(p)
+    terminals = [l0.add_terminal(text, punct=False) for text in texts]
+    scene = l1.add_fnode(None, layer1.EdgeTags.ParallelScene)
+    for tag, children in ((layer1.EdgeTags.Participant, terminals[:2]), (layer1.EdgeTags.Function, terminals[2:3]),
+                          (layer1.EdgeTags.Process, terminals[3:])):
+        unit = l1.add_fnode(scene, tag)
+        for terminal in children:
+            unit.add(layer1.EdgeTags.Terminal, terminal)
+    return p
+
+
+def test_annotate_passages(tmp_path, monkeypatch):
+    def get_nlp(*args, **kwargs):
+        raise AssertionError("spaCy loaded for an annotated passage")
+    monkeypatch.setattr(textutil, "get_nlp", get_nlp)
+    conllu_path = tmp_path / "ud.conllu"
+    conllu_path.write_text(PASSIVE + "\n\n", encoding="utf-8")
+    texts = ["The", "cat", "was", "seen."]  # the last terminal covers two words
+    annotated, unannotated = transform.annotate_passages([_passage("s1_0", texts), _passage("missing_0", texts)],
+                                                         conllu_path)
+    terminals = annotated.layer(layer0.LAYER_ID).all
+    expected = {Attr.ORTH: ["The", "cat", "was", "seen"], Attr.LEMMA: ["the", "cat", "was", "seen"],
+                Attr.TAG: ["_"] * 4, Attr.POS: ["DET", "NOUN", "AUX", "VERB"],
+                Attr.DEP: ["det", "nsubj:pass", "aux:pass", "root"], Attr.HEAD: [1, 2, 1, 0]}
+    for attr in Attr:
+        values = expected.get(attr, [None] * 4)
+        assert [t.tok[attr.value] for t in terminals] == values, attr
+        assert [t.extra[attr.key] for t in terminals] == values, attr
+    assert annotated.extra["annotated"]
+    participant = next(c for candidates in extract_candidates(annotated).values() for c in candidates
+                       if c.edge.tag == layer1.EdgeTags.Participant)
+    assert participant.dep == {"det", "nsubj:pass"}
+    assert participant.heads == {terminals[1]}
+
+    assert "annotated" not in unannotated.extra
+    assert all(t.tok is None and not t.extra for t in unannotated.layer(layer0.LAYER_ID).all)
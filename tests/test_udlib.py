@@ -0,0 +1,204 @@
+import json
+import os
+
+import pytest
+
+import UDLib
+
+"""Tests UDLib trees, readers and token alignment."""
+
+
+def _tree(rows):
+    record = "# sent_id = test\n" + "\n".join(
+        "\t".join([key, form, form.lower(), "X", "X", "_", head, "dep", "_", "_"]) for key, form, head in rows)
+    return UDLib.UDTree(*UDLib.conllu2graph(record))
+
+
+def _block(sent_id, rows):
+    return "\n".join(["# sent_id = " + sent_id] + [
+        "\t".join([key, form, form.lower(), upos, "_", "_", head, deprel, "_", "_"])
+        for key, form, upos, head, deprel in rows])
+
+
+PASSIVE = _block("s1", [("1", "The", "DET", "2", "det"), ("2", "cat", "NOUN", "4", "nsubj:pass"),
+                        ("3", "was", "AUX", "4", "aux:pass"), ("4", "seen", "VERB", "0", "root"),
+                        ("5", ".", "PUNCT", "4", "punct")])
+ACTIVE = _block("s2", [("1", "Dogs", "NOUN", "2", "nsubj"), ("2", "bark", "VERB", "0", "root"),
+                       ("3", ".", "PUNCT", "2", "punct")])
+
+
+# Adjacent multiword tokens, one not spelled out by its words, and an empty node
+ROWS = [("1-2", "Monthly's", "_"), ("1", "Monthly", "3"), ("2", "'s", "1"),
+        ("3-4", "del", "_"), ("3", "de", "5"), ("4", "el", "5"),
+        ("4.1", "ellipsis", "_"), ("5", "mundo", "0")]
+
+
+def test_word_segments_adjacent_ranges():
+    assert UDLib._get_word_segments(_tree(ROWS)) == [
+        ("Monthly", ["1"]), ("'s", ["2"]), ("del", ["3", "4"]), ("mundo", ["5"])]
+
+
+def test_align_tokens_adjacent_ranges():
+    alignment = UDLib.align_tokens(_tree(ROWS), ["Monthly", "'s", "del", "mundo"])
+    assert [alignment.get_key(position) for position in range(1, 5)] == ["1", "2", None, "5"]
+    assert alignment.token2keys[3] == ["3", "4"]
+
+
+@pytest.mark.parametrize("newline", ("\n", "\r\n"))
+@pytest.mark.parametrize("start, separator, end", (
+        ("", "\n\n", "\n\n"),  # well-formed
+        ("\n\n", "\n\n\n\n", ""),  # repeated blank lines, no trailing newline
+        ("", "\n \n\t\n", "\n")))  # whitespace-only lines
+def test_iter_conllu_blocks(tmp_path, newline, start, separator, end):
+    path = tmp_path / "blocks.conllu"
+    path.write_bytes((start + PASSIVE + separator + ACTIVE + end).replace("\n", newline).encode("utf-8"))
+    assert list(UDLib.iter_conllu_blocks(path)) == [PASSIVE, ACTIVE]
+    for compact in (False, True):
+        assert [str(tree) for tree in UDLib.iter_conllu_trees(path, compact=compact)] == [PASSIVE, ACTIVE]
+
+
+def _write_blocks(path, *blocks, newline="\n"):
+    path.write_bytes("".join(block + "\n\n" for block in blocks).replace("\n", newline).encode("utf-8"))
+
+
+def _forbid_build(monkeypatch):
+    def build_conllu_index(path):
+        raise AssertionError("index rebuilt for %s" % path)
+    monkeypatch.setattr(UDLib, "build_conllu_index", build_conllu_index)
+
+
+@pytest.mark.parametrize("newline", ("\n", "\r\n"))
+def test_conllu_index(tmp_path, newline):
+    path = tmp_path / "index.conllu"
+    _write_blocks(path, PASSIVE, ACTIVE, newline=newline)
+    index = UDLib.load_conllu_index(path)
+    assert os.path.exists(str(path) + UDLib.INDEX_SUFFIX)
+    assert len(index) == 2 and "s2" in index and "s3" not in index
+    assert index.get_block("s2").splitlines() == ACTIVE.splitlines()
+    assert str(index.get_tree("s1")) == PASSIVE
+
+
+def test_conllu_index_reused(tmp_path, monkeypatch):
+    path = tmp_path / "index.conllu"
+    _write_blocks(path, PASSIVE, ACTIVE)
+    offsets = UDLib.load_conllu_index(path).offsets
+    _forbid_build(monkeypatch)
+    assert UDLib.load_conllu_index(path).offsets == offsets
+
+
+def test_conllu_index_rebuilt(tmp_path, monkeypatch):
+    path = tmp_path / "index.conllu"
+    _write_blocks(path, PASSIVE)
+    UDLib.load_conllu_index(path)
+    _write_blocks(path, PASSIVE, ACTIVE)  # size changes
+    assert "s2" in UDLib.load_conllu_index(path)
+    stat = os.stat(path)
+    _write_blocks(path, PASSIVE, ACTIVE.replace("s2", "s3"))  # same size
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    index = UDLib.load_conllu_index(path)
+    assert "s3" in index and "s2" not in index
+    _forbid_build(monkeypatch)  # the rebuilt index is stored again
+    assert "s3" in UDLib.load_conllu_index(path)
+
+
+@pytest.mark.parametrize("sidecar", ("{not json", "[]", "{}", {"offsets": 5}, {"offsets": {"s2": 0}}))
+def test_conllu_index_corrupt_sidecar(tmp_path, sidecar):
+    path = tmp_path / "index.conllu"
+    _write_blocks(path, PASSIVE, ACTIVE)
+    if isinstance(sidecar, dict):  # up to date, but with broken offsets
+        stat = os.stat(path)
+        sidecar = json.dumps(dict(sidecar, mtime=stat.st_mtime_ns, size=stat.st_size))
+    with open(str(path) + UDLib.INDEX_SUFFIX, "w", encoding="utf-8") as f:
+        f.write(sidecar)
+    assert str(UDLib.load_conllu_index(path).get_tree("s2")) == ACTIVE
+
+
+def _udtree(block):
+    return UDLib.UDTree(*UDLib.conllu2graph(block))
+
+
+def test_copy_mutable_node():
+    tree = _udtree(PASSIVE)
+    copy = tree.copy()
+    assert copy.nodes["2"] is tree.nodes["2"]  # shared until written
+    node = copy.get_mutable_node("2")
+    node.FORM = "dog"
+    assert node is not tree.nodes["2"]
+    assert copy.get_mutable_node("2") is node  # copied on the first write only
+    assert copy.nodes["1"] is tree.nodes["1"]
+    assert str(tree) == PASSIVE
+    tree.get_mutable_node("1").FORM = "A"  # the original is copied on write too
+    assert copy.nodes["1"].FORM == "The"
+
+
+def test_copy_mutable_edges():
+    tree = _udtree(PASSIVE)
+    copy = tree.copy()
+    assert copy.graph["4"] is tree.graph["4"]
+    edges = copy.get_mutable_edges("4")
+    edges[0].relation = "dep"
+    edges.pop()
+    assert edges is not tree.graph["4"]
+    assert copy.get_mutable_edges("4") is edges
+    assert copy.graph["2"] is tree.graph["2"]
+    assert tree.graph == _udtree(PASSIVE).graph
+
+
+def test_copy_set_relation():
+    tree = _udtree(PASSIVE)
+    assert tree.get_base_relations()["2"] == "nsubj"
+    copy = tree.copy()
+    copy.set_relation("2", "obj")
+    assert str(tree) == PASSIVE
+    assert tree.graph == _udtree(PASSIVE).graph
+    assert tree.get_base_relations()["2"] == "nsubj"
+    assert copy.get_base_relations()["2"] == "obj"
+    # Only the node and the edge lists of it and its head were copied
+    assert [key for key in copy.nodes if copy.nodes[key] is not tree.nodes[key]] == ["2"]
+    assert sorted(key for key in copy.graph if copy.graph[key] is not tree.graph[key]) == ["2", "4"]
+
+
+CONLLU_PATH = os.path.join(os.path.dirname(__file__), "..", "conllu", "en_ewt-ud-dev.conllu")
+
+
+def test_compact_trees(tmp_path):
+    path = tmp_path / "compact.conllu"
+    _write_blocks(path, PASSIVE, ACTIVE, str(_tree(ROWS)))
+    for conllu_path in (path, CONLLU_PATH):
+        for tree, compact in zip(UDLib.iter_conllu_trees(conllu_path),
+                                 UDLib.iter_conllu_trees(conllu_path, compact=True)):
+            assert compact.id_lines == tree.id_lines
+            assert compact.keys == tree.keys
+            assert list(zip(*compact.columns)) == [tuple(str(tree.nodes[key]).split("\t")) for key in tree.keys]
+            for key in ["0"] + tree.keys:
+                assert compact.get_node_children(key) == tree.get_node_children(key)
+            for key in tree.keys:
+                assert compact.get_node(key) == tree.nodes[key]
+                assert [edge.relation for edge in tree.graph[key] if edge.directionality == "up"] == \
+                    ([] if compact.get_node(key).HEAD == "_" else [compact.get_node(key).DEPREL])
+            assert compact.get_real_root() == tree.get_real_root()
+            assert str(compact.to_udtree()) == str(compact) == str(tree)
+
+
+def _relations(tree, key):
+    """Returns the DEPREL of a node, its upward edge relation and its head's downward edge relation."""
+    up = [edge for edge in tree.graph[key] if edge.directionality == "up"]
+    down = [edge.relation for edge in tree.graph[up[0].head] if edge.directionality == "down" and edge.head == key]
+    return tree.nodes[key].DEPREL, up[0].relation, down
+
+
+@pytest.mark.parametrize("key, relation, base", (("2", "obj", "obj"), ("1", "nmod:poss", "nmod"),
+                                                  ("3", "aux", "aux"), ("4", "root", "root")))
+def test_set_relation(key, relation, base):
+    tree = _udtree(PASSIVE)
+    tree.get_base_relations()
+    tree.set_relation(key, relation)
+    assert _relations(tree, key) == (relation, relation, [relation])
+    assert tree.get_base_relations()[key] == base
+    assert tree.get_base_relations() == _udtree(str(tree)).get_base_relations()
+    assert tree.get_edge_positions() == _udtree(str(tree)).get_edge_positions()
+    assert tree.graph == _udtree(str(tree)).graph
+
+
+def test_base_relations():
+    assert _udtree(PASSIVE).get_base_relations() == {"1": "det", "2": "nsubj", "3": "aux", "4": "root", "5": "punct"}
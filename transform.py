@@ -1,12 +1,19 @@
-import pathlib
-from copy import deepcopy
-from typing import Dict
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+from typing import Dict, List, Optional, Tuple
 from difflib import ndiff
 
 import UDLib
 
+from ucca.convert import file2passage
+from ucca import layer0
 from ucca.core import Passage
-from ucca.ioutil import read_files_and_dirs
+from ucca.ioutil import gen_files
+from ucca.textutil import Attr
 
 
 #
@@ -54,30 +61,30 @@ def convert_nominal_predicates(
     }
     nominal_dependents = ['compound', 'nmod']
 
-    # Traverse the ucca_parse; find one-word tokens and check their categories.
-    # If the category is P, look for the corresponding nominal token
-    # in the UD parse. In an ideal world, we would also replace S's, but
-    # they are not identified accurately enough.
+    # Scan the terminals of ucca_parse and find one-word units over them;
+    # if the unit's category is P, look for the nominal token aligned with
+    # the terminal in the UD parse. In an ideal world, we would also replace
+    # S's, but they are not identified accurately enough.
     n_changes = 0
-    ud_tree = deepcopy(ud_tree)
-    tokens2node_keys = {
-        ud_tree.nodes[node_key].FORM : node_key
-        for node_key in ud_tree.keys
-    }
-    for node in ucca_parse.nodes.values():
-        text = str(node).strip()
-        if ' ' not in text:
+    ud_tree = ud_tree.copy()
+    terminals = ucca_parse.layer(layer0.LAYER_ID).all
+    alignment = UDLib.align_tokens(ud_tree, [t.text for t in terminals])
+    for terminal in terminals:
+        for terminal_edge in terminal.incoming:
+            node = terminal_edge.parent
+            if len(node) != 1:
+                continue
             category = node.ftag if hasattr(node, "ftag") else node.tag
             if category == 'P':
                 # Check if this token is analysed as a nominal in the
                 # corresponding UD tree.
-                ud_token_key = tokens2node_keys.get(text, None)
+                ud_token_key = alignment.get_key(terminal.position)
                 if ud_token_key is not None:
                     ud_token = ud_tree.nodes[ud_token_key]
                     # Strip subcategories
                     deprel = ud_token.DEPREL.split(':')[0]
                     if deprel in relation_conversion_dict:
-                        # print(f'{text:>12} : {category} -> {relation_conversion_dict[deprel]}')
+                        # print(f'{terminal.text:>12} : {category} -> {relation_conversion_dict[deprel]}')
                         # Change this token's deprel
                         n_changes += 1
                         replace_label(
@@ -131,19 +138,15 @@ def collapse_participants(
 
 def get_top_level_ancestor(node):
     """
-    Traverses the passage upwards and returns the node's
-    ancestor that is immediately below the root.
+    Returns the node's ancestor that is immediately below the root
+    (or the node itself if it is the root or immediately below it).
+    The ancestors of all nodes are computed at once by the primary
+    index of the passage's foundational layer.
     """
-    # If node is already the root, return it.
     try:
-        if not node.fparent:
-            return node
-        parent = node
-        while parent.fparent.fparent:
-            parent = parent.fparent
-    except:
+        return node.top_level_ancestor
+    except AttributeError:  # not a foundational node
         return node
-    return parent
 
 
 def get_sent_id(tree: UDLib.UDTree):
@@ -158,75 +161,304 @@ def get_sent_id(tree: UDLib.UDTree):
         return None
 
 
+def get_block_sent_id(block: str):
+    """
+    Returns the sent_id of a raw CoNLL-U block if it is
+    present; None otherwise.
+    """
+    for line in block.splitlines():
+        if not line.startswith('#'):
+            return None
+        if line.startswith('# sent_id = '):
+            return line.strip()[len('# sent_id = '):]
+    else:
+        return None
+
+
+def get_passage_sent_id(ucca_path) -> str:
+    """
+    Returns the UD sent_id of a TUPA parse file, whose
+    name is the sent_id followed by a paragraph suffix.
+    """
+    passage_id = os.path.splitext(os.path.basename(ucca_path))[0]
+    return passage_id.rsplit('_', 1)[0]
+
+
 def swap_labels(ud_tree: UDLib.UDTree, replacement_dict: Dict[str, str]):
     """
     Replaces labels in the tree according to the replacement dict in place.
     Labels' subcategories are ignored.
     """
 
-    for node_key in ud_tree.keys:
-        ud_tree.nodes[node_key].DEPREL = replacement_dict.get(
-            ud_tree.nodes[node_key].DEPREL.split(':')[0],
-            ud_tree.nodes[node_key].DEPREL)
-        for i in range(len(ud_tree.graph[node_key])):
-            ud_tree.graph[node_key][i].relation = replacement_dict.get(
-                ud_tree.graph[node_key][i].relation.split(':')[0],
-                ud_tree.graph[node_key][i].relation)
+    for node_key, relation in ud_tree.get_base_relations().items():
+        if relation in replacement_dict:
+            ud_tree.set_relation(node_key, replacement_dict[relation])
 
 
 def replace_label(ud_tree: UDLib.UDTree, node_id: str, new_label: str):
     """
-    Replaces the dependency label in the node and all edge goint out
-    or coming into this node in place.
+    Replaces the dependency label in the node and both edges connecting
+    it to its head in place.
     """
 
-    ud_tree.nodes[node_id].DEPREL = new_label
-    for i, edge in enumerate(ud_tree.graph[node_id]):
-        if edge.directionality == 'up':
-            ud_tree.graph[node_id][i].relation = new_label
-            # Replace the relation in the downward edge in the parent.
-            parent_id = edge.head
-            if parent_id != '0':
-                for j, parent_edge in enumerate(ud_tree.graph[parent_id]):
-                    if (
-                        parent_edge.directionality == 'down' and
-                        parent_edge.head == node_id
-                    ):
-                        ud_tree.graph[parent_id][j].relation = new_label
-                        break
+    ud_tree.set_relation(node_id, new_label)
+
+
+#
+# Annotation
+#
+
+# Fine-grained construction scores in ucca.constructions need the POS
+# tags, dependency relations and heads of terminals, which
+# ucca.textutil.annotate gets by running a spaCy model over every
+# passage. Our parses come with gold UD trees, so we take these
+# columns from the trees instead.
+
+def annotate_passage(
+        ucca_parse: Passage,
+        ud_tree: UDLib.UDTree,
+        as_array: bool = True,
+        as_extra: bool = True
+    ) -> Passage:
+    """
+    Fills the annotation of the terminals of ucca_parse from the aligned
+    words of ud_tree in place, in the layout of ucca.textutil.annotate:
+    with as_array, a row of Attr columns per terminal in
+    layer0.extra["doc"]; with as_extra, an entry per Attr in the extra
+    dict of every terminal. ORTH, LEMMA, TAG, POS and DEP are the FORM,
+    LEMMA, XPOS, UPOS and DEPREL strings, HEAD is the offset of the
+    head's first terminal from the terminal (0 for the root), and the
+    other columns are None. Terminals that are not aligned to a word
+    get None everywhere. The passage is marked as annotated, so that
+    spaCy is not loaded to annotate it again.
+    """
+    l0 = ucca_parse.layer(layer0.LAYER_ID)
+    terminals = l0.all
+    alignment = UDLib.align_tokens(ud_tree, [t.text for t in terminals])
+    rows = []
+    for terminal in terminals:
+        keys = alignment.token2keys.get(terminal.position, [])
+        # A terminal covering several words takes the one whose head
+        # is outside of the terminal.
+        key = next((k for k in keys if ud_tree.nodes[k].HEAD not in keys),
+                   keys[0] if keys else None)
+        row = dict.fromkeys(Attr)
+        if key is not None:
+            ud_node = ud_tree.nodes[key]
+            row.update({
+                Attr.ORTH: ud_node.FORM,
+                Attr.LEMMA: ud_node.LEMMA,
+                Attr.TAG: ud_node.XPOS,
+                Attr.POS: ud_node.UPOS,
+                Attr.DEP: ud_node.DEPREL
+            })
+            head_tokens = alignment.key2tokens.get(ud_node.HEAD)
+            if ud_node.HEAD == '0':
+                row[Attr.HEAD] = 0
+            elif head_tokens:
+                head = l0.by_position(head_tokens[0])
+                if head.paragraph == terminal.paragraph:
+                    row[Attr.HEAD] = head.para_pos - terminal.para_pos
+        rows.append(row)
+    if as_array:
+        docs = l0.docs(max((t.paragraph for t in terminals), default=1))
+        for i in range(len(docs)):
+            docs[i] = []
+        for terminal, row in zip(terminals, rows):
+            docs[terminal.paragraph - 1].append([row[attr] for attr in Attr])
+    if as_extra:
+        for terminal, row in zip(terminals, rows):
+            for attr, value in row.items():
+                terminal.extra[attr.key] = value
+    ucca_parse.extra['annotated'] = True
+    return ucca_parse
+
+
+def annotate_passages(passages, conllu_path):
+    """
+    Annotates passages in place with annotate_passage, taking the UD
+    tree of each from conllu_path by the sent_id in its ID, and yields
+    them. Passages without a UD tree are yielded unannotated.
+    """
+    ud_index = _get_ud_index(os.fspath(conllu_path))
+    for passage in passages:
+        sent_id = passage.ID.rsplit('_', 1)[0]
+        if sent_id in ud_index:
+            annotate_passage(passage, ud_index.get_tree(sent_id))
+        yield passage
+
+
+#
+# Batch processing
+#
+
+
+@lru_cache(maxsize=None)
+def _get_ud_index(conllu_path: str) -> UDLib.ConlluIndex:
+    # Loaded once per worker process and reused for all of its shards.
+    return UDLib.load_conllu_index(conllu_path)
+
+
+def _transform_shard(
+    shard: List[Tuple[str, str]],
+    conllu_path: str,
+    collapse: bool = True,
+    collapsed_label: str = 'A',
+    with_diffs: bool = False
+):
+    """
+    Transforms a shard of (sent_id, UCCA parse file) pairs. Returns
+    a list of (sent_id, transformed block or None, n_changes, diff
+    or None) in the order of the shard and the time spent on it
+    in seconds.
+    """
+    started = time.perf_counter()
+    ud_index = _get_ud_index(conllu_path)
+    results = []
+    for sent_id, ucca_path in shard:
+        ucca_parse = file2passage(ucca_path)
+        ud_tree = ud_index.get_tree(sent_id)
+        ud_tree_transformed, n_changes = convert_nominal_predicates(
+            ud_tree, ucca_parse, collapsed_label)
+        if n_changes == 0:
+            results.append((sent_id, None, 0, None))
+            continue
+        if collapse:
+            collapse_participants(ud_tree_transformed, collapsed_label)
+        block = str(ud_tree_transformed)
+        diff = None
+        if with_diffs:
+            diff = ''.join(ndiff(
+                str(ud_tree).splitlines(keepends=True),
+                block.splitlines(keepends=True)))
+        results.append((sent_id, block, n_changes, diff))
+    return results, time.perf_counter() - started
+
+
+def transform_corpus(
+    ucca_dir,
+    conllu_path,
+    output_path,
+    report_path=None,
+    collapse: bool = True,
+    collapsed_label: str = 'A',
+    workers: Optional[int] = None,
+    chunk_size: int = 16,
+    stream: bool = False,
+    log=sys.stderr
+) -> int:
+    """
+    Transforms every UD tree in conllu_path that has a TUPA parse in
+    ucca_dir and writes the whole treebank, in its original sentence
+    order, to output_path. If report_path is given, the ndiff of every
+    changed sentence is written there. Sentences are independent, so
+    (sent_id, parse file) pairs are split into shards of chunk_size and
+    processed by a pool of worker processes (os.cpu_count() if workers
+    is None; in this process if workers is 1). With stream=True, blocks
+    are written as soon as their shard is done instead of after all
+    shards have finished. Timing of every shard is reported to log.
+    If several parse files map to the same sent_id, only the first is
+    used. Returns the number of changes.
+    """
+    conllu_path = os.fspath(conllu_path)
+    ud_index = _get_ud_index(conllu_path)
+    pairs = []
+    ucca_paths = {}
+    for ucca_path in gen_files(os.fspath(ucca_dir)):
+        sent_id = get_passage_sent_id(ucca_path)
+        if sent_id not in ud_index:
+            print(f'No UD tree for {ucca_path}', file=log)
+        elif sent_id in ucca_paths:
+            # Every block is written once, so only the first parse is used.
+            print(f'Skipping {ucca_path}: {sent_id} is already parsed '
+                  f'in {ucca_paths[sent_id]}', file=log)
+        else:
+            ucca_paths[sent_id] = ucca_path
+            pairs.append((sent_id, ucca_path))
+    # Shards follow the treebank order, so results arrive in that order.
+    pairs.sort(key=lambda pair: ud_index.offsets[pair[0]])
+    shards = [pairs[i:i + chunk_size] for i in range(0, len(pairs), chunk_size)]
+    transform_shard = partial(
+        _transform_shard,
+        conllu_path=conllu_path,
+        collapse=collapse,
+        collapsed_label=collapsed_label,
+        with_diffs=report_path is not None)
+
+    def iter_results(shard_results):
+        for i, (results, elapsed) in enumerate(shard_results, 1):
+            print(f'Shard {i}/{len(shards)}: {len(results)} sentences '
+                  f'in {elapsed:.3f}s', file=log)
+            yield from results
+
+    n_changes = 0
+    started = time.perf_counter()
+    executor = None
+    if workers == 1:
+        shard_results = map(transform_shard, shards)
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        shard_results = executor.map(transform_shard, shards)
+    report = open(report_path, 'w', encoding='utf-8') if report_path else None
+    try:
+        results = iter_results(shard_results)
+        if not stream:
+            results = iter(list(results))
+        result = next(results, None)
+        with open(output_path, 'w', encoding='utf-8') as out:
+            for block in UDLib.iter_conllu_blocks(conllu_path):
+                if result is not None and result[0] == get_block_sent_id(block):
+                    sent_id, transformed, n, diff = result
+                    if transformed is not None:
+                        block = transformed
+                        n_changes += n
+                    if diff is not None:
+                        report.write(f'# sent_id = {sent_id} ({n} changes)\n')
+                        report.write(diff + '\n')
+                    result = next(results, None)
+                out.write(block + '\n\n')
+        if result is not None:
+            raise ValueError(f'Transformed sentence {result[0]} does not '
+                             f'match any block of {conllu_path}')
+    finally:
+        if report is not None:
+            report.close()
+        if executor is not None:
+            executor.shutdown()
+    print(f'{len(pairs)} sentences, {n_changes} changes '
+          f'in {time.perf_counter() - started:.3f}s', file=log)
+    return n_changes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Convert UCCA-detected nominal predicates in a UD '
+                    'treebank to clauses.')
+    parser.add_argument('ucca_dir', help='directory with TUPA parses')
+    parser.add_argument('conllu', help='UD treebank to transform')
+    parser.add_argument('output', help='path of the transformed treebank')
+    parser.add_argument('-r', '--report', default=None,
+                        help='write the diff of every changed sentence here')
+    parser.add_argument('--no-collapse', dest='collapse',
+                        action='store_false',
+                        help='do not collapse participants after the transform')
+    parser.add_argument('-l', '--collapsed-label', default='A',
+                        help='label of collapsed participants (default: A)')
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='number of worker processes (default: CPU count)')
+    parser.add_argument('-c', '--chunk-size', type=int, default=16,
+                        help='number of sentences per shard')
+    parser.add_argument('-s', '--stream', action='store_true',
+                        help='write sentences as soon as their shard is done')
+    args = parser.parse_args(argv)
+    transform_corpus(args.ucca_dir, args.conllu, args.output,
+                     report_path=args.report,
+                     collapse=args.collapse,
+                     collapsed_label=args.collapsed_label,
+                     workers=args.workers,
+                     chunk_size=args.chunk_size,
+                     stream=args.stream)
 
 
 if __name__ == "__main__":
-    TUPA_PARSES_DIR = pathlib.Path('parsed')
-    TUPA_DEV   = pathlib.Path('UD_English-EWT_text_dev')
-    TUPA_TEST  = pathlib.Path('UD_English-EWT_text_test')
-    TUPA_TRAIN = pathlib.Path('UD_English-EWT_text_train')
-
-    UD_PARSES_DIR = pathlib.Path('conllu')
-    UD_DEV   = pathlib.Path('en_ewt-ud-dev.conllu')
-    UD_TEST  = pathlib.Path('en_ewt-ud-test.conllu')
-    UD_TRAIN = pathlib.Path('en_ewt-ud-train.conllu')
-
-    # Iterate over parsed passages; find corresponding UD blocks.
-    # Perform the replacements and show the diff of each affected block.
-    collapse_participants_after_transform = True
-    for ucca_dirname, conllu_filename in zip(
-        [TUPA_DEV, TUPA_TEST, TUPA_TRAIN],
-        [UD_DEV, UD_TEST, UD_TRAIN]
-    ):
-        ucca_parses = read_files_and_dirs(str(TUPA_PARSES_DIR / ucca_dirname))
-        ud_trees = UDLib.conllu2trees(UD_PARSES_DIR / conllu_filename)
-        ud_tree_dict = { get_sent_id(tree): tree for tree in ud_trees }
-        for ucca_parse in ucca_parses:
-            sentence_id = ucca_parse.ID.rsplit('_', 1)[0]
-            print(sentence_id)
-            ud_tree = ud_tree_dict[sentence_id]
-            ud_tree_transformed, n_changes = convert_nominal_predicates(ud_tree, ucca_parse)
-            if n_changes > 0:
-                if collapse_participants_after_transform:
-                    collapse_participants(ud_tree_transformed)
-                diff = ndiff(
-                    str(ud_tree).splitlines(keepends=True),
-                    str(ud_tree_transformed).splitlines(keepends=True))
-                print(''.join(diff))
-                input()
\ No newline at end of file
+    main()
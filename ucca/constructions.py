@@ -31,6 +31,12 @@ class Construction:
         if self.criterion(candidate):
             yield self
 
+    def __reduce_ex__(self, protocol):
+        # Criteria are often lambdas, which cannot be pickled, so refer to registered constructions by name instead
+        if CONSTRUCTION_BY_NAME.get(self.name) is self:
+            return _get_registered, (self.name,)
+        return super().__reduce_ex__(protocol)
+
     @property
     def is_punct(self):
         return self.name in (EdgeTags.Punctuation, layer0.NodeTags.Punct, "punct")
@@ -58,24 +64,93 @@ def create_category_construction(tag):
 
 
 def positions(terminals):
-    return frozenset(t.position for t in terminals)
+    """
+    :param terminals: iterable of Terminals
+    :return: terminal yield: int whose bit i is set if the terminal in position i is in terminals
+    """
+    bits = 0
+    for t in terminals:
+        bits |= 1 << t.position
+    return bits
+
+
+def yield_positions(terminal_yield):
+    """
+    :param terminal_yield: terminal yield, as returned by positions()
+    :return: sorted list of the terminal positions in the yield
+    """
+    return [i for i in range(terminal_yield.bit_length()) if terminal_yield >> i & 1]
+
+
+def terminal_yields(passage):
+    """
+    Find the terminal yields of all nodes in the passage in one bottom-up pass, following the same edges as
+    get_terminals() (for foundational nodes, only non-remote edges).
+    :param passage: Passage object to find terminal yields in
+    :return: dict: node ID -> (terminal yield, terminal yield excluding punctuation), as returned by positions()
+    """
+    yields = {}
+    for terminal in passage.layer(layer0.LAYER_ID).all:
+        bit = 1 << terminal.position
+        yields[terminal.ID] = (bit, 0 if terminal.punct else bit)
+    visiting = set()  # nodes whose children are still being visited, to stop at cycles
+    for node in passage.layer(layer1.LAYER_ID).all:
+        stack = [node]
+        while stack:
+            node = stack[-1]
+            if node.ID in yields:
+                stack.pop()
+                continue
+            children = [e.child for e in node if not (node.tag == NodeTags.Foundational and e.attrib.get("remote"))]
+            unvisited = [c for c in children if c.ID not in yields and c.ID not in visiting]
+            if unvisited:
+                visiting.add(node.ID)
+                stack += unvisited
+                continue
+            visiting.discard(node.ID)
+            stack.pop()
+            terminal_yield = terminal_yield_no_punct = 0
+            for child in children:
+                child_yield, child_yield_no_punct = yields.get(child.ID, (0, 0))
+                terminal_yield |= child_yield
+                terminal_yield_no_punct |= child_yield_no_punct
+            yields[node.ID] = (terminal_yield, 0 if node.tag == NodeTags.Punctuation else terminal_yield_no_punct)
+    return yields
 
 
 class Candidate:
-    def __init__(self, edge, reference=None, reference_yield_tags=None, verbose=False):
+    def __init__(self, edge, reference=None, reference_yield_tags=None, verbose=False, yields=None):
+        """
+        :param edge: Edge in layer 1 to create a candidate for
+        :param reference: Passage object to get terminals from (default: the passage of the edge)
+        :param reference_yield_tags: yield tags from reference passage for fine-grained evaluation
+        :param verbose: whether to print tagged text
+        :param yields: terminal yields of the passage, as returned by terminal_yields() (default: find them here)
+        """
         self.edge = edge
         self.out_tags = {t for e in edge.child for t in e.tags}
         self.reference = reference
         self.reference_yield_tags = reference_yield_tags
         self.verbose = verbose
-        self.terminals = self.edge.child.get_terminals()
-        self._terminal_yield = positions(self.terminals)
-        self._terminal_yield_no_punct = positions((self.edge.parent if self.is_implicit() else self.edge.child).get_terminals(punct=False))
-        if self.reference is not None:
-            self.terminals = [self.reference.by_id(t.ID) for t in self.terminals]
+        if yields is None:
+            yields = terminal_yields(edge.root)
+        parent_yield_no_punct = yields[edge.parent.ID][1]
+        self._terminal_yield, self._terminal_yield_no_punct = yields[edge.child.ID]
+        if self.is_implicit():
+            self._terminal_yield_no_punct = parent_yield_no_punct
         self.extra = {}
-        self.is_unary_child = self.edge.parent.incoming and (
-                self._terminal_yield_no_punct == positions(self.edge.parent.get_terminals(punct=False)))
+        self._terminals = None  # computed on first access
+        self.is_unary_child = bool(self.edge.parent.incoming) and \
+            self._terminal_yield_no_punct == parent_yield_no_punct
+
+    @property
+    def terminals(self):
+        if self._terminals is None:
+            terminals = self.edge.child.get_terminals()
+            if self.reference is not None:
+                terminals = [self.reference.by_id(t.ID) for t in terminals]
+            self._terminals = terminals
+        return self._terminals
 
     def _annotate(self, attr=None):
         passage = self.edge.parent.root
@@ -115,7 +190,9 @@ class Candidate:
         if ret is None:
             self._annotate()
             para_pos = {t.para_pos for t in self.terminals}
-            ret = self.extra[attr] = {t for t in self.terminals if int(t.tok[attr]) not in para_pos}
+            # HEAD is the offset of the head from the terminal, within the paragraph
+            ret = self.extra[attr] = {t for t in self.terminals
+                                      if t.tok[attr.value] is None or t.para_pos + t.tok[attr.value] not in para_pos}
         return ret
 
     @property
@@ -202,6 +279,10 @@ def get_by_name(name):
     return name if isinstance(name, Construction) else CATEGORY_DESCRIPTIONS.get(name) or CONSTRUCTION_BY_NAME[name]
 
 
+def _get_registered(name):
+    return CONSTRUCTION_BY_NAME[name]
+
+
 def get_by_names(names=None):
     return list(map(get_by_name, names or ()))
 
@@ -230,7 +311,7 @@ def extract_candidates(passage, constructions=None, reference=None, reference_yi
     :param constructions: list of constructions to include or None for all
     :param reference: Passage object to get POS tags from, and categories for fine-grained scores (default: `passage')
     :param reference_yield_tags: yield tags from reference passage for fine-grained evaluation:
-                   dict: set of terminal indices (excluding punctuation) ->
+                   dict: terminal yield as returned by positions() (excluding punctuation) ->
                    list of edges of the Construction whose yield (excluding remotes and punctuation) is that set
     :param verbose: whether to print tagged text
     :return: dict of Construction -> list of corresponding Candidates
@@ -246,9 +327,10 @@ def extract_candidates(passage, constructions=None, reference=None, reference_yi
         else:
             keys.append(construction)
     extracted = OrderedDict((c, []) for c in keys)
+    yields = terminal_yields(passage)
     for node in passage.layer(layer1.LAYER_ID).all:
         for edge in node:
-            candidate = Candidate(edge, reference or passage, reference_yield_tags, verbose=verbose)
+            candidate = Candidate(edge, reference or passage, reference_yield_tags, verbose=verbose, yields=yields)
             if not candidate.excluded:
                 for construction in candidate.constructions(constructions):
                     extracted.setdefault(construction, []).append(candidate)
@@ -260,7 +342,7 @@ def create_passage_yields(p, *args, tags=True, **kwargs):
     :param p: passage to find terminal yields of
     :param tags: instead of Candidates, map simply to their edge tags
     :returns: dict: Construction ->
-                   dict: set of terminal indices (excluding punctuation) ->
+                   dict: terminal yield as returned by positions() (excluding punctuation) ->
                          list of Candidates whose yield (excluding remotes and punctuation) is that set
     """
     yield_candidates = OrderedDict()
@@ -11,13 +11,13 @@ The possible other formats are:
     sdp (SemEval 2015 semantic dependency parsing shared task)
 """
 
+import contextlib
 import os
 import pickle
 import re
 import sys
 import xml.etree.ElementTree as ET
-import xml.sax.saxutils
-from collections import defaultdict
+from collections import defaultdict, deque
 from itertools import repeat, groupby
 from operator import attrgetter, itemgetter
 
@@ -157,6 +157,7 @@ class SiteUtil:
 
     @staticmethod
     def unescape(x):
+        import xml.sax.saxutils  # imports urllib, so only when site XML is read
         return xml.sax.saxutils.unescape(x, {'&quot;': '"', r"\u2019": "'"})
 
     @staticmethod
@@ -650,90 +651,171 @@ def to_standard(passage):
     return root
 
 
-def from_standard(root, extra_funcs=None):
-    def _str2bool(x):
-        return x == "True"
-
-    attribute_converters = {
-        'paragraph': int,
-        'paragraph_position': int,
-        'remote': _str2bool,
-        'implicit': _str2bool,
-        'uncertain': _str2bool,
-        'suggest': _str2bool,
-        None: str,
-    }
-
-    def _loads(x):
-        try:
-            return False if x == "False" else x == "True" or json.loads(x)
-        except JSONDecodeError:
-            return x
+def _str2bool(x):
+    return x == "True"
 
-    layer_objs = {layer0.LAYER_ID: layer0.Layer0,
-                  layer1.LAYER_ID: layer1.Layer1}
 
-    node_objs = {layer0.NodeTags.Word: layer0.Terminal,
-                 layer0.NodeTags.Punct: layer0.Terminal,
-                 layer1.NodeTags.Foundational: layer1.FoundationalNode,
-                 layer1.NodeTags.Linkage: layer1.Linkage,
-                 layer1.NodeTags.Punctuation: layer1.PunctNode}
+_STANDARD_ATTRIBUTE_CONVERTERS = {
+    'paragraph': int,
+    'paragraph_position': int,
+    'remote': _str2bool,
+    'implicit': _str2bool,
+    'uncertain': _str2bool,
+    'suggest': _str2bool,
+    None: str,
+}
+
+_STANDARD_LAYERS = {layer0.LAYER_ID: layer0.Layer0,
+                    layer1.LAYER_ID: layer1.Layer1}
+
+_STANDARD_NODES = {layer0.NodeTags.Word: layer0.Terminal,
+                   layer0.NodeTags.Punct: layer0.Terminal,
+                   layer1.NodeTags.Foundational: layer1.FoundationalNode,
+                   layer1.NodeTags.Linkage: layer1.Linkage,
+                   layer1.NodeTags.Punctuation: layer1.PunctNode}
+
+
+def _standard_loads(x):
+    try:
+        return False if x == "False" else x == "True" or json.loads(x)
+    except JSONDecodeError:
+        return x
 
-    def _get_attrib(elem):
-        try:
-            return {k: attribute_converters.get(k, str)(v)
-                    for k, v in elem.find('attributes').items()}
-        except AttributeError as e:
-            raise core.UCCAError("Element %s has no attributes" % elem.get("ID")) from e
 
+def _get_standard_attrib(elem):
+    try:
+        return {k: _STANDARD_ATTRIBUTE_CONVERTERS.get(k, str)(v)
+                for k, v in elem.find('attributes').items()}
+    except AttributeError as e:
+        raise core.UCCAError("Element %s has no attributes" % elem.get("ID")) from e
+
+
+def _get_standard_extra(elem, extra_funcs=None):
+    extra_elem = elem.find('extra')
+    if extra_elem is None:
+        return {}
+    return {k: (extra_funcs or {}).get(k, _standard_loads)(v) for k, v in extra_elem.items()}
+
+
+def _get_standard_categories(edge_elem):
+    categories = [(c.get('tag'), c.get('slot'), c.get('layer_name'), c.get('parent_name'))
+                  for c in edge_elem.findall('category')]
+    if not categories:  # an old xml format
+        categories.append((edge_elem.get('type'), "", "", ""))
+    return categories
+
+
+def from_standard(root, extra_funcs=None):
     def _add_extra(obj, elem):
-        if elem.find('extra') is not None:
-            for k, v in elem.find('extra').items():
-                obj.extra[k] = (extra_funcs or {}).get(k, _loads)(v)
+        obj.extra.update(_get_standard_extra(elem, extra_funcs))
 
-    passage = core.Passage(root.get('passageID'), attrib=_get_attrib(root))
+    passage = core.Passage(root.get('passageID'), attrib=_get_standard_attrib(root))
     _add_extra(passage, root)
-    edge_elems = []
-    for layer_elem in root.findall('layer'):
-        layer_id = layer_elem.get('layerID')
-        layer = layer_objs[layer_id](passage, attrib=_get_attrib(layer_elem))
-        _add_extra(layer, layer_elem)
-        # some nodes are created automatically, skip creating them when found
-        # in the XML (they should have 'constant' IDs) but take their edges
-        # and attributes/extra from the XML (may have changed from the default)
-        created_nodes = {x.ID: x for x in layer.all}
-        for node_elem in layer_elem.findall('node'):
-            node_id = node_elem.get('ID')
-            tag = node_elem.get('type')
-            node = created_nodes.get(node_id)
-            if node is None:
-                node = node_objs[tag](root=passage, ID=node_id, tag=tag, attrib=_get_attrib(node_elem))
-            else:
-                for key, value in _get_attrib(node_elem).items():
-                    node.attrib[key] = value
-            _add_extra(node, node_elem)
-            edge_elems += [(node, x) for x in node_elem.findall('edge')]
-
-    # Adding edges (must have all nodes before doing so)
-    for from_node, edge_elem in edge_elems:
-        to_node = passage.nodes[edge_elem.get('toID')]
-        categories_elems = edge_elem.findall('category')
-        categories = []
-        for c in categories_elems:
-            tag = c.get('tag')
-            slot = c.get('slot')
-            layer = c.get('layer_name')
-            parent = c.get('parent_name')
-            categories.append((tag, slot, layer, parent))
-        if not categories:  # an old xml format
-            tag = edge_elem.get('type')
-            categories.append((tag, "", "", ""))
-        edge = from_node.add_multiple(categories, to_node, edge_attrib=_get_attrib(edge_elem))
-        _add_extra(edge, edge_elem)
+    # Nodes are added in bulk, so sort each layer once at the end
+    with passage.deferred_ordering():
+        edge_elems = []
+        for layer_elem in root.findall('layer'):
+            layer_id = layer_elem.get('layerID')
+            layer = _STANDARD_LAYERS[layer_id](passage, attrib=_get_standard_attrib(layer_elem))
+            _add_extra(layer, layer_elem)
+            # some nodes are created automatically, skip creating them when found
+            # in the XML (they should have 'constant' IDs) but take their edges
+            # and attributes/extra from the XML (may have changed from the default)
+            created_nodes = {x.ID: x for x in layer.all}
+            for node_elem in layer_elem.findall('node'):
+                node_id = node_elem.get('ID')
+                tag = node_elem.get('type')
+                node = created_nodes.get(node_id)
+                if node is None:
+                    node = _STANDARD_NODES[tag](root=passage, ID=node_id, tag=tag,
+                                                attrib=_get_standard_attrib(node_elem))
+                else:
+                    for key, value in _get_standard_attrib(node_elem).items():
+                        node.attrib[key] = value
+                _add_extra(node, node_elem)
+                edge_elems += [(node, x) for x in node_elem.findall('edge')]
+
+        # Adding edges (must have all nodes before doing so)
+        for from_node, edge_elem in edge_elems:
+            to_node = passage.nodes[edge_elem.get('toID')]
+            categories = _get_standard_categories(edge_elem)
+            edge = from_node.add_multiple(categories, to_node, edge_attrib=_get_standard_attrib(edge_elem))
+            _add_extra(edge, edge_elem)
 
     return passage
 
 
+def from_standard_file(source, extra_funcs=None):
+    """Reads a Passage from a standard XML file, streaming it with iterparse.
+
+    Equivalent to ``from_standard(ET.parse(source).getroot())``, but each node
+    element is discarded as soon as it is read, and Edges are added in bulk
+    once all Nodes exist, rather than one at a time.
+
+    :param source: file name or file object to read from
+    :param extra_funcs: functions to convert "extra" values by key, as in from_standard
+
+    :return: the Passage object
+    """
+    passage = layer = root = layer_elem = None
+    created_nodes = {}
+    edges = []  # tuples of (parent node, child ID, categories, attrib, extra)
+
+    def _create_passage():
+        created = core.Passage(root.get('passageID'), attrib=_get_standard_attrib(root))
+        created.extra.update(_get_standard_extra(root, extra_funcs))
+        return created
+
+    def _create_layer():
+        created = _STANDARD_LAYERS[layer_elem.get('layerID')](passage, attrib=_get_standard_attrib(layer_elem))
+        created.extra.update(_get_standard_extra(layer_elem, extra_funcs))
+        # some nodes are created automatically, skip creating them when found
+        # in the XML (they should have 'constant' IDs)
+        created_nodes.update((x.ID, x) for x in created.all)
+        return created
+
+    with contextlib.ExitStack() as stack:
+        for event, elem in ET.iterparse(source, events=("start", "end")):
+            if event == "start":
+                if elem.tag == "root":
+                    root = elem
+                elif elem.tag == "layer":
+                    if passage is None:  # the passage attributes have been read by now
+                        passage = _create_passage()
+                        stack.enter_context(passage.deferred_ordering())
+                    layer, layer_elem = None, elem
+            elif elem.tag == "node":
+                if layer is None:  # the layer attributes have been read by now
+                    layer = _create_layer()
+                node_id, tag = elem.get('ID'), elem.get('type')
+                node = created_nodes.get(node_id)
+                if node is None:
+                    node = _STANDARD_NODES[tag](root=passage, ID=node_id, tag=tag, attrib=_get_standard_attrib(elem))
+                else:
+                    node.attrib.update(_get_standard_attrib(elem))
+                node.extra.update(_get_standard_extra(elem, extra_funcs))
+                edges += [(node, edge_elem.get('toID'), _get_standard_categories(edge_elem),
+                           _get_standard_attrib(edge_elem), _get_standard_extra(edge_elem, extra_funcs))
+                          for edge_elem in elem.findall('edge')]
+                elem.clear()
+            elif elem.tag == "layer":
+                if layer is None:
+                    layer = _create_layer()
+                root.remove(elem)
+        if passage is None:  # no layers at all
+            return _create_passage()
+        nodes = passage.nodes
+        new_edges = []
+        for node, child_id, categories, attrib, extra in edges:
+            edge = core.Edge(root=passage, parent=node, child=nodes[child_id], attrib=attrib)
+            edge.categories = [core.Category(*category) for category in categories]
+            edge.extra.update(extra)
+            new_edges.append(edge)
+        # Adding edges (must have all nodes before doing so)
+        passage._add_edges(new_edges)
+    return passage
+
+
 def from_text(text, passage_id="1", tokenized=False, one_per_line=False, extra_format=None, lang="en",
               return_text=False, *args, **kwargs):
     """Converts from tokenized strings to a Passage object.
@@ -915,95 +997,199 @@ def from_json(lines, *args, skip_category_mapping=False, by_external_id=False, *
         text=token["text"], punct=not token["require_annotation"], paragraph=1)
         for token in sorted(d["tokens"], key=itemgetter("index_in_task"))}
 
-    # Create non-terminals
+    # Create non-terminals, adding all Edges at once when the Nodes exist, so that Edge lists are sorted only once
     l1 = layer1.Layer1(passage)
+    head = l1.heads[0]
     tree_id_to_node = {}
     token_id_to_preterminal = {}
+    edges = []
     category_name_to_edge_tag = {} if skip_category_mapping else EdgeTags.__dict__
-    # Assuming topological sort: parents always appear before children
-    for unit in sorted(d["annotation_units"], key=itemgetter("is_remote_copy")):  # Get non-remotes first
-        tree_id = unit["tree_id"]
-        remote = unit["is_remote_copy"]
-        cloned_from_tree_id = None
-        if remote:
-            cloned_from_tree_id = unit.get("cloned_from_tree_id")
-            if cloned_from_tree_id is None:
-                raise ValueError("Remote unit %s without cloned_from_tree_id" % tree_id)
-        elif tree_id in tree_id_to_node:
-            raise ValueError("Unit %s is repeated" % tree_id)
-        parent_tree_id = unit["parent_tree_id"]
-        if parent_tree_id is None:  # Root node: no need to create
-            tree_id_to_node[tree_id] = None
-            continue
-        try:
-            parent_node = tree_id_to_node[parent_tree_id]
-        except KeyError as e:
-            raise ValueError("Unit %s appears before its parent, %s" % (tree_id, parent_tree_id)) from e
 
-        unit_categories = []
-        for category in unit.get("categories", ()):
+    def _add_edge(parent, edge_categories, child, edge_attrib=None):
+        edge = core.Edge(root=passage, parent=parent, child=child, attrib=edge_attrib)
+        edge.categories = [core.Category(*category) for category in edge_categories]
+        edges.append(edge)
+
+    with passage.deferred_ordering():
+        # Assuming topological sort: parents always appear before children
+        for unit in sorted(d["annotation_units"], key=itemgetter("is_remote_copy")):  # Get non-remotes first
+            tree_id = unit["tree_id"]
+            remote = unit["is_remote_copy"]
+            cloned_from_tree_id = None
+            if remote:
+                cloned_from_tree_id = unit.get("cloned_from_tree_id")
+                if cloned_from_tree_id is None:
+                    raise ValueError("Remote unit %s without cloned_from_tree_id" % tree_id)
+            elif tree_id in tree_id_to_node:
+                raise ValueError("Unit %s is repeated" % tree_id)
+            parent_tree_id = unit["parent_tree_id"]
+            if parent_tree_id is None:  # Root node: no need to create
+                tree_id_to_node[tree_id] = None
+                continue
             try:
-                category_name = category.get("name") or categories[category["id"]]['name']
+                parent_node = tree_id_to_node[parent_tree_id] or head
             except KeyError as e:
-                raise ValueError("Category missing from layer: " + category["id"]) from e
-            c_tag = category_name_to_edge_tag.get(category_name.replace(" ", ""), category_name.replace(" ", "_"))
-            c_slot = category.get("slot", "")
-            c_data = categories[category["id"]]
-            c_layer = c_data['layer']
-            if c_layer == base_layer:
-                base_slot = c_slot
-            c_parent = c_data['parent']
-            if c_parent:   # make sure it is not empty
-                c_parent = category_name_to_edge_tag.get(c_parent['name'].replace(" ", ""),
-                                                         c_parent['name'].replace(" ", "_"))
-            unit_categories.append((c_tag, c_slot, c_layer, c_parent))
-
-        if not unit_categories:
-            raise ValueError("Unit %s has no categories" % tree_id)
-
-        edge_attrib = {}
-        for unit_category, *_ in unit_categories:
-            if unit_category == EdgeTags.Uncertain:
-                edge_attrib["uncertain"] = True
-            elif unit_category == COORDINATED_MAIN_REL:
-                edge_attrib[COORDINATED_MAIN_REL] = True
-        if not edge_attrib:
-            edge_attrib = None
-        unit_categories = [uc for uc in unit_categories if uc[0] not in IGNORED_ABBREVIATIONS]
-        children_tokens = [] if unit["type"] == "IMPLICIT" else unit["children_tokens"]
-        try:
-            terminal = token_id_to_terminal[children_tokens[0]["id"]] if len(children_tokens) == 1 else None
-        except (IndexError, KeyError):
-            terminal = None
-        if remote:
+                raise ValueError("Unit %s appears before its parent, %s" % (tree_id, parent_tree_id)) from e
+
+            unit_categories = []
+            for category in unit.get("categories", ()):
+                try:
+                    category_name = category.get("name") or categories[category["id"]]['name']
+                except KeyError as e:
+                    raise ValueError("Category missing from layer: " + category["id"]) from e
+                c_tag = category_name_to_edge_tag.get(category_name.replace(" ", ""),
+                                                      category_name.replace(" ", "_"))
+                c_slot = category.get("slot", "")
+                c_data = categories[category["id"]]
+                c_layer = c_data['layer']
+                if c_layer == base_layer:
+                    base_slot = c_slot
+                c_parent = c_data['parent']
+                if c_parent:   # make sure it is not empty
+                    c_parent = category_name_to_edge_tag.get(c_parent['name'].replace(" ", ""),
+                                                             c_parent['name'].replace(" ", "_"))
+                unit_categories.append((c_tag, c_slot, c_layer, c_parent))
+
+            if not unit_categories:
+                raise ValueError("Unit %s has no categories" % tree_id)
+
+            edge_attrib = {}
+            for unit_category, *_ in unit_categories:
+                if unit_category == EdgeTags.Uncertain:
+                    edge_attrib["uncertain"] = True
+                elif unit_category == COORDINATED_MAIN_REL:
+                    edge_attrib[COORDINATED_MAIN_REL] = True
+            unit_categories = [uc for uc in unit_categories if uc[0] not in IGNORED_ABBREVIATIONS]
+            children_tokens = [] if unit["type"] == "IMPLICIT" else unit["children_tokens"]
             try:
-                node = tree_id_to_node[cloned_from_tree_id]
-            except KeyError as e:
-                raise ValueError("Remote copy %s refers to nonexistent unit: %s" %
-                                 (tree_id, cloned_from_tree_id)) from e
-            l1.add_remote_multiple(parent_node, unit_categories, node, edge_attrib=edge_attrib)
-        elif not skip_category_mapping and terminal and layer0.is_punct(terminal):
-            tree_id_to_node[tree_id] = l1.add_punct(None, terminal, base_layer, base_slot, edge_attrib=edge_attrib)
-        elif tree_id not in tree_id_to_node:
-            node = tree_id_to_node[tree_id] = l1.add_fnode_multiple(parent_node, unit_categories,
-                                                                    implicit=unit["type"] == "IMPLICIT",
-                                                                    edge_attrib=edge_attrib)
-            node.extra['tree_id'] = tree_id
-            comment = unit.get("comment")
-            if comment:
-                node.extra['remarks'] = comment
-            for token in children_tokens:
-                token_id_to_preterminal[token["id"]] = node
-
-    # Attach terminals to non-terminals
-    for token_id, node in token_id_to_preterminal.items():
-        terminal = token_id_to_terminal[token_id]
-        if skip_category_mapping or not layer0.is_punct(terminal):
-            node.add(EdgeTags.Terminal, terminal)
+                terminal = token_id_to_terminal[children_tokens[0]["id"]] if len(children_tokens) == 1 else None
+            except (IndexError, KeyError):
+                terminal = None
+            if remote:
+                try:
+                    node = tree_id_to_node[cloned_from_tree_id]
+                except KeyError as e:
+                    raise ValueError("Remote copy %s refers to nonexistent unit: %s" %
+                                     (tree_id, cloned_from_tree_id)) from e
+                edge_attrib["remote"] = True
+                _add_edge(parent_node, unit_categories, node, edge_attrib)
+            elif not skip_category_mapping and terminal and layer0.is_punct(terminal):
+                node = tree_id_to_node[tree_id] = layer1.PunctNode(root=passage, tag=layer1.NodeTags.Punctuation,
+                                                                   ID=l1.next_id())
+                _add_edge(head, [(EdgeTags.Punctuation, base_slot, base_layer)], node, edge_attrib or None)
+                _add_edge(node, [(EdgeTags.Terminal, base_slot, base_layer)], terminal)
+            elif tree_id not in tree_id_to_node:
+                node = tree_id_to_node[tree_id] = layer1.FoundationalNode(
+                    root=passage, tag=layer1.NodeTags.Foundational, ID=l1.next_id(),
+                    attrib={'implicit': True} if unit["type"] == "IMPLICIT" else {})
+                if unit_categories:
+                    _add_edge(parent_node, unit_categories, node, edge_attrib or None)
+                node.extra['tree_id'] = tree_id
+                comment = unit.get("comment")
+                if comment:
+                    node.extra['remarks'] = comment
+                for token in children_tokens:
+                    token_id_to_preterminal[token["id"]] = node
+
+        # Attach terminals to non-terminals
+        for token_id, node in token_id_to_preterminal.items():
+            terminal = token_id_to_terminal[token_id]
+            if skip_category_mapping or not layer0.is_punct(terminal):
+                _add_edge(node, [(EdgeTags.Terminal,)], terminal)
+        passage._add_edges(edges)
 
     yield passage
 
 
+_JSON_SEPARATORS = re.compile(r"[\s,]*")
+JSON_READ_SIZE = 2 ** 20
+JSON_CHUNK_SIZE = 64
+
+
+def _iter_json_values(source, read_size=JSON_READ_SIZE):
+    """Reads the values in a JSON-Lines file, or the elements of a JSON array, without reading the whole file.
+    :param source: file name or text file object to read from
+    :param read_size: number of characters to read at a time
+    :return: generator of the decoded values
+    """
+    decoder = json.JSONDecoder()
+    with contextlib.ExitStack() as stack:
+        f = stack.enter_context(open(source, encoding="utf-8")) if isinstance(source, str) else source
+        buffer, pos, eof, array = "", 0, False, None
+        while True:
+            pos = _JSON_SEPARATORS.match(buffer, pos).end()
+            if pos == len(buffer):
+                if eof:
+                    return
+                buffer, pos = f.read(read_size), 0
+                eof = not buffer
+                continue
+            if array is None:  # the first value decides whether the values are the elements of an array
+                array = buffer[pos] == "["
+                if array:
+                    pos += 1
+                    continue
+            if array and buffer[pos] == "]":
+                return
+            try:
+                value, pos = decoder.raw_decode(buffer, pos)
+            except JSONDecodeError:
+                if eof:
+                    raise
+                # Read at least as much as is buffered, so that decoding a long value takes linear time
+                more = f.read(max(read_size, len(buffer) - pos))
+                buffer, pos = buffer[pos:] + more, 0
+                eof = not more
+                continue
+            yield value
+
+
+def from_json_file(source, *args, **kwargs):
+    """Reads Passage objects from a dump of many UCCA-App tasks, such as an export of the annotation server.
+    The file is read incrementally, so only the task being converted is kept in memory.
+    :param source: file name or text file object, either in JSON-Lines format (one task per line) or a JSON array
+    :param kwargs: passed to from_json: skip_category_mapping, by_external_id
+    :return: generator of Passage objects
+    """
+    for task in _iter_json_values(source):
+        yield from from_json(task, *args, **kwargs)
+
+
+def json_file2files(source, outdir=".", processes=None, chunk_size=JSON_CHUNK_SIZE, binary=False, **kwargs):
+    """Converts a dump of many UCCA-App tasks to standard XML (or pickle) files, one per Passage.
+    The dump is read here (see from_json_file), and the tasks are converted and written by worker processes.
+    Passage objects are not sent back, since unpickling a Passage takes longer than creating it from its task.
+    :param source: file name or text file object, either in JSON-Lines format (one task per line) or a JSON array
+    :param outdir: directory to write the files to
+    :param processes: number of worker processes (default: number of CPUs; 1 to convert in this process)
+    :param chunk_size: number of tasks to send to a worker process at a time
+    :param binary: whether to write pickle files (or XML)
+    :param kwargs: passed to from_json: skip_category_mapping, by_external_id
+    :return: generator of the names of the written files, in the order of the tasks
+    """
+    from ucca.ioutil import map_chunks  # ucca.ioutil imports this module
+    for filenames in map_chunks(_json_tasks2files, _iter_json_values(source), outdir, binary, kwargs,
+                                chunk_size=chunk_size, processes=processes):
+        yield from filenames
+
+
+def _json_tasks2files(tasks, outdir, binary, kwargs):
+    """
+    :param tasks: list of UCCA-App task dicts
+    :param outdir: directory to write the files to
+    :param binary: whether to write pickle files (or XML)
+    :param kwargs: passed to from_json
+    :return: list of the names of the written files
+    """
+    filenames = []
+    for task in tasks:
+        for passage in from_json(task, **kwargs):
+            filename = os.path.join(outdir, passage.ID + (".pickle" if binary else ".xml"))
+            passage2file(passage, filename, binary=binary)
+            filenames.append(filename)
+    return filenames
+
+
 IGNORED_EDGE_TAGS = {EdgeTags.Punctuation, EdgeTags.Terminal}
 
 
@@ -1071,9 +1257,9 @@ def to_json(passage, *args, return_dict=False, tok_task=None, all_categories=Non
                         key=attrgetter("child.ID")), start=1)]
 
         # (tree id elements, edges per child) for each edge
-        queue = _outgoing([], root_node)
+        queue = deque(_outgoing([], root_node))
         while queue:  # breadth-first search
-            tree_id_elements, edges = queue.pop(0)  # edges all have the same child but may differ by category
+            tree_id_elements, edges = queue.popleft()  # edges all have the same child but may differ by category
             edge = edges[0]
             node = edge.child
             remote = edge.attrib.get("remote", False)
@@ -1114,10 +1300,15 @@ def to_json(passage, *args, return_dict=False, tok_task=None, all_categories=Non
 
     annotation_units = sorted(annotation_units, key=_tree_id_key)
     if tokens and annotation_units:
+        token_id_to_start_index = {}
+        for token in tokens:
+            start_index = token_id_to_start_index.get(token["id"])
+            if start_index is None or token["start_index"] < start_index:
+                token_id_to_start_index[token["id"]] = token["start_index"]
         for _, units in groupby(annotation_units[1:], key=lambda u: _tree_id_key(u)[:-1]):
             units = list(units)
-            start_indices = [min([t["start_index"] for t in tokens
-                                  if any(s["id"] == t["id"] for s in u["children_tokens"])] or [-1]) for u in units]
+            start_indices = [min([token_id_to_start_index[s["id"]] for s in u["children_tokens"]
+                                  if s["id"] in token_id_to_start_index] or [-1]) for u in units]
             assert all(i == -1 or i < j for i, j in zip(start_indices[:-1], start_indices[1:])), \
                 "Siblings are not correctly ordered by their minimal start_index: " +\
                 ", ".join(u["comment"] for u in units)
@@ -1149,7 +1340,7 @@ def file2passage(filename):
 
 def xml2passage(filename):
     with open(filename, encoding="utf-8") as f:
-        return from_standard(ET.ElementTree().parse(f))
+        return from_standard_file(f)
 
 
 def pickle2passage(filename):
@@ -8,6 +8,8 @@ are connected between themselves and to Nodes in other layers using
 
 """
 
+import collections
+import contextlib
 import functools
 
 # Max number of digits allowed for a unique ID
@@ -30,7 +32,12 @@ def id_orderkey(node):
         first order lexicography the layer ID then numerically the unique ID.
 
     """
-    layer, unique = node.ID.split(Node.ID_SEPARATOR)
+    return _id_orderkey(node.ID)
+
+
+@functools.lru_cache(maxsize=2 ** 16)
+def _id_orderkey(ID):
+    layer, unique = ID.split(Node.ID_SEPARATOR)
     return "{} {:>{}}".format(layer, unique, UNIQUE_ID_MAX_DIGITS)
 
 
@@ -81,7 +88,7 @@ class UnimplementedMethodError(UCCAError):
     pass
 
 
-class ModifyPassage:
+def ModifyPassage(fn):
     """Decorator for changing a :class:`Passage` or any member of it.
 
     This decorator is mandatory for anything which causes the elements in
@@ -96,37 +103,29 @@ class ModifyPassage:
     decorated instead (and should be called after the instance attributes
     are set).
 
-    Attributes:
-        fn: the function object to decorate
-
-    """
-
-    def __init__(self, fn):
-        self.fn = fn
-
-    def __get__(self, obj, cls):
-        """Used to bind the function to the instance (add 'self')."""
-        return functools.partial(self.__call__, obj)
+    The decorated function is a plain function, so it is bound like any other
+    method, without creating a wrapper object on every attribute access.
 
-    def __call__(self, *args, **kwargs):
-        """Decorating functions which modify :class:`Passage` elements.
+    :param fn: the function object to decorate, whose first argument is the
+            object which modifies :class:`Passage`, and it has an attribute
+            root which points to the Passage it is part of.
+    :return: the decorated function, which raises FrozenPassageError if the
+            :class:`Passage` is frozen and can't be modified.
 
-        :param args: list of all arguments, assuming the first is the object
-                which modifies :class:`Passage`, and it has an attribute root
-                which points to the Passage it is part of.
-        :param kwargs: list of all keyword arguments
-        :return: The decorated function result.
-        :raise FrozenPassageError: if the :class:`Passage` is frozen and can't be
-                modified.
-        """
-
-        @functools.wraps(self.fn)
-        def decorated(*args, **kwargs):
-            if args[0].root.frozen:
-                raise FrozenPassageError(args[0].root.ID)
-            return self.fn(*args, **kwargs)
-
-        return decorated(*args, **kwargs)
+    """
+    @functools.wraps(fn)
+    def modify_passage(obj, *args, **kwargs):
+        root = obj.root
+        if root.frozen:
+            raise FrozenPassageError(root.ID)
+        # Bump the modification counter on both sides of the change, so
+        # nothing cached before or during it is considered up to date.
+        root._modifications += 1
+        try:
+            return fn(obj, *args, **kwargs)
+        finally:
+            root._modifications += 1
+    return modify_passage
 
 
 class _AttributeDict:
@@ -394,9 +393,15 @@ class Node:
         ID_SEPARATOR: separator function between the Layer ID and the unique
             Node ID in the complete ID of the Node. Mustn't be alphanumeric.
 
+    When the Passage is frozen, incoming, outgoing, parents and children are
+    tuples computed once and shared by all callers, rather than copies.
+
     """
 
     ID_SEPARATOR = '.'
+    # Tuples of the parent and child Nodes while the Passage is frozen
+    _frozen_parents = None
+    _frozen_children = None
 
     def __init__(self, ID, root, tag, attrib=None, *,
                  orderkey=edge_id_orderkey):
@@ -463,10 +468,16 @@ class Node:
 
     @property
     def parents(self):
+        """A new list of the parent Nodes, or a shared tuple of them if the Passage is frozen."""
+        if self._frozen_parents is not None:
+            return self._frozen_parents
         return [edge.parent for edge in self._incoming]
 
     @property
     def children(self):
+        """A new list of the child Nodes, or a shared tuple of them if the Passage is frozen."""
+        if self._frozen_children is not None:
+            return self._frozen_children
         return [edge.child for edge in self._outgoing]
 
     def __bool__(self):
@@ -563,7 +574,11 @@ class Node:
     @orderkey.setter
     def orderkey(self, value):
         self._orderkey = value
-        self._outgoing.sort(key=value)
+        if self._frozen_children is None:
+            self._outgoing.sort(key=value)
+        else:
+            self._outgoing = tuple(sorted(self._outgoing, key=value))
+            self._frozen_children = tuple(edge.child for edge in self._outgoing)
 
     @ModifyPassage
     def destroy(self):
@@ -648,7 +663,7 @@ class Node:
         return sorted([e1 for e1 in edges if not any(e1.equals(e2) for e2 in other_edges)],
                       key=edge_id_orderkey)
 
-    def iter(self, obj="nodes", method="dfs", duplicates=False, key=None):
+    def iter(self, obj="nodes", method="dfs", duplicates=False, key=None, with_depth=False):
         """Iterates the :class:`Node` objects in the subtree of self.
 
         :param obj: yield Node objects (use value "nodes", default) or Edge
@@ -663,6 +678,10 @@ class Node:
                 takes one argument (the item) and returns True if it should be
                 returned to the user. If an item isn't returned, its subtree
                 is still iterated.  Defaults to None (returns all items).
+            with_depth: If True, yield (node, depth, edge) tuples, where depth
+                is the distance from self and edge is the Edge through which the
+                node was reached (None for self). Only for obj="nodes".
+                Defaults to False.
 
         Yields:
             a :class:`Node` or :class:`Edge` object according to the iteration
@@ -673,27 +692,54 @@ class Node:
             raise ValueError("method can be either 'dfs' or 'bfs'")
         if obj not in ("nodes", "edges"):
             raise ValueError("obj can be either 'nodes' or 'edges'")
-        processed = set()
-        if obj == 'nodes':
-            waiting = [self]
+        if with_depth and obj != "nodes":
+            raise ValueError("with_depth is only supported with obj='nodes'")
+        nodes = obj == "nodes"
+        bfs = method == "bfs"
+        # (item, depth, edge) entries: BFS pops the first entry (a queue), DFS the last one (a stack)
+        if nodes:
+            waiting = collections.deque([(self, 0, None)])
         else:
-            waiting = self._outgoing[:]
-        while len(waiting):
-            curr = waiting.pop(0)
+            waiting = collections.deque((edge, 1, None) for edge in self._outgoing)
+            if not bfs:
+                waiting.reverse()
+        pop = waiting.popleft if bfs else waiting.pop
+        processed = set()
+        while waiting:
+            entry = pop()
+            curr, depth = entry[0], entry[1] + 1
+            if not duplicates:
+                if curr in processed:  # was waiting more than once
+                    continue
+                processed.add(curr)
             if key is None or key(curr):
-                yield curr
-            processed.add(curr)
-            to_add = curr.children if obj == 'nodes' else list(curr.child)
-            to_add = [x for x in to_add if duplicates or x not in processed]
-            if method == "bfs":
-                waiting.extend(to_add)
+                yield entry if with_depth else curr
+            if nodes:
+                to_add = [(e.child, depth, e) for e in curr._outgoing if duplicates or e.child not in processed]
             else:
-                waiting = to_add + waiting
+                to_add = [(e, depth, None) for e in curr.child._outgoing if duplicates or e not in processed]
+            waiting.extend(to_add if bfs else reversed(to_add))
 
     def get_terminals(self, *args, **kwargs):
         """Returns a list of all terminals under the span of this Node."""
         return [t for e in self._outgoing for t in e.child.get_terminals(*args, **kwargs)]
 
+    def _freeze(self):
+        """Called when the :class:`Passage` becomes frozen.
+
+        The Edge lists are replaced by tuples, which the accessors can return
+        without copying, and the parents and children are computed once.
+
+        """
+        self._incoming, self._outgoing = tuple(self._incoming), tuple(self._outgoing)
+        self._frozen_parents = tuple(edge.parent for edge in self._incoming)
+        self._frozen_children = tuple(edge.child for edge in self._outgoing)
+
+    def _unfreeze(self):
+        """Called when the :class:`Passage` stops being frozen."""
+        self._incoming, self._outgoing = list(self._incoming), list(self._outgoing)
+        self._frozen_parents = self._frozen_children = None
+
 
 class Layer:
     """Group of similar :class:`Node` objects in UCCA annotation graph.
@@ -717,9 +763,17 @@ class Layer:
         all: a list of all the Nodes which are part of this Layer
         heads: a list of all Nodes which have no incoming Edges in the subgraph
             of the Layer (can have Edges from Nodes in other Layers).
+            When the Passage is frozen, all and heads are shared tuples.
+
+    Ordering is maintained lazily: mutations only mark the Layer as unordered
+    (unless a Node is appended in order), and the Nodes are sorted once when
+    all/heads are next read.
 
     """
 
+    # Whether _all and _heads are currently sorted by the orderkey
+    _ordered = True
+
     def __init__(self, ID, root, attrib=None, *, orderkey=id_orderkey):
         """Creates a new :class:`Layer` object.
 
@@ -754,10 +808,14 @@ class Layer:
 
     @property
     def all(self):
+        """A new list of the Nodes in the Layer, or a shared tuple of them if the Passage is frozen."""
+        self._sort()
         return self._all[:]
 
     @property
     def heads(self):
+        """A new list of the head Nodes of the Layer, or a shared tuple of them if the Passage is frozen."""
+        self._sort()
         return self._heads[:]
 
     @property
@@ -767,8 +825,8 @@ class Layer:
     @orderkey.setter
     def orderkey(self, value):
         self._orderkey = value
-        self._all.sort(key=value)
-        self._heads.sort(key=value)
+        self._ordered = False
+        self._sort()
 
     def equals(self, other, *, ordered=False, ignore_node=None, ignore_edge=None):
         """Returns whether two Layer objects are equal.
@@ -810,6 +868,21 @@ class Layer:
             return False
         return not other_heads
 
+    def _sort(self):
+        """Sorts the Nodes of the Layer by the orderkey, if they may be unordered."""
+        if not self._ordered:
+            if isinstance(self._all, tuple):  # frozen, but the orderkey has changed
+                self._all = tuple(sorted(self._all, key=self._orderkey))
+                self._heads = tuple(sorted(self._heads, key=self._orderkey))
+            else:
+                self._all.sort(key=self._orderkey)
+                self._heads.sort(key=self._orderkey)
+            self._ordered = True
+
+    def _edges_change_order(self):
+        """Returns whether adding or removing edges may change the order of Nodes."""
+        return self._orderkey is not id_orderkey  # IDs never change
+
     def _add_edge(self, edge):
         """Alters self.heads if an :class:`Edge` has been added to the subgraph.
 
@@ -820,10 +893,22 @@ class Layer:
 
         """
         if edge.child in self._heads:
-            self._heads.remove(edge.child)
-        # Order may depend on edges, so re-order
-        self._all.sort(key=self._orderkey)
-        self._heads.sort(key=self._orderkey)
+            self._heads.remove(edge.child)  # does not change the order of the others
+        if self._edges_change_order():
+            self._ordered = False
+
+    def _add_edges(self, edges):
+        """Alters self.heads after several :class:`Edge` objects were added at once.
+
+        Equivalent to calling :meth:`_add_edge` for each of them.
+
+        :param edges: the Edges added to the Layer subgraph
+
+        """
+        children = {id(edge.child) for edge in edges}
+        self._heads = [node for node in self._heads if id(node) not in children]
+        if self._edges_change_order():
+            self._ordered = False
 
     def _remove_edge(self, edge):
         """Alters self.heads if an :class:`Edge` has been removed.
@@ -836,10 +921,9 @@ class Layer:
         """
         if edge.child.layer == self and all(p.layer != self for p in edge.child.parents):
             self._heads.append(edge.child)
-            self._heads.sort(key=self._orderkey)
-        # Order may depend on edges, so re-order
-        self._all.sort(key=self._orderkey)
-        self._heads.sort(key=self._orderkey)
+            self._ordered = False
+        elif self._edges_change_order():
+            self._ordered = False
 
     def _add_node(self, node):
         """Adds a :class:`node` to the :class:`Layer`.
@@ -847,10 +931,14 @@ class Layer:
         Assumes node has no incoming or outgoing :class:`Edge` objects.
 
         """
+        if self._ordered and not self._root._deferred_ordering:
+            key = self._orderkey(node)
+            self._ordered = all(not nodes or self._orderkey(nodes[-1]) <= key
+                                for nodes in (self._all, self._heads))
+        else:
+            self._ordered = False
         self._all.append(node)
-        self._all.sort(key=self._orderkey)
         self._heads.append(node)
-        self._heads.sort(key=self._orderkey)
 
     def _remove_node(self, node):
         """Removes a :class:`node` from the :class:`Layer`.
@@ -879,6 +967,25 @@ class Layer:
         """
         pass  # meant to be overriden by subclasses
 
+    def _freeze(self):
+        """Called when the :class:`Passage` becomes frozen.
+
+        Since the Layer can't change afterwards, derived data can be
+        computed once here. The Node lists are replaced by tuples, which
+        :attr:`all` and :attr:`heads` return without copying.
+
+        """
+        self._sort()
+        self._all, self._heads = tuple(self._all), tuple(self._heads)
+        for node in self._all:
+            node._freeze()
+
+    def _unfreeze(self):
+        """Called when the :class:`Passage` stops being frozen."""
+        self._all, self._heads = list(self._all), list(self._heads)
+        for node in self._all:
+            node._unfreeze()
+
 
 class Passage:
     """An annotated text with UCCA annotation graph.
@@ -898,6 +1005,11 @@ class Passage:
 
     """
 
+    # Incremented on every modification; used to validate cached data.
+    _modifications = 0
+    # Number of active deferred_ordering() contexts
+    _deferred_ordering = 0
+
     def __init__(self, ID, attrib=None):
         """Creates a new :class:`Passage` object.
 
@@ -911,16 +1023,54 @@ class Passage:
         self._nodes = {}
         self._categories = {}
         self._refined_categories = []
-        self.frozen = False
+        self._frozen = False
+
+    def __setstate__(self, state):
+        if "frozen" in state:  # pickled before frozen became a property
+            state["_frozen"] = state.pop("frozen")
+        self.__dict__.update(state)
 
     @property
     def ID(self):
         return self._ID
 
+    @property
+    def frozen(self):
+        return self._frozen
+
+    @frozen.setter
+    def frozen(self, value):
+        was_frozen, self._frozen = self._frozen, value
+        if value and not was_frozen:
+            for layer in self._layers.values():
+                layer._freeze()
+        elif was_frozen and not value:
+            for layer in self._layers.values():
+                layer._unfreeze()
+
     @property
     def root(self):
         return self
 
+    @contextlib.contextmanager
+    def deferred_ordering(self):
+        """Context for bulk construction, in which Layers skip ordering new Nodes.
+
+        Nodes added inside the context are not compared against the existing
+        ones; every Layer is sorted once when the outermost context exits.
+        Reading :attr:`Layer.all` or :attr:`Layer.heads` inside the context
+        still returns them ordered, at the cost of a sort.
+
+        """
+        self._deferred_ordering += 1
+        try:
+            yield self
+        finally:
+            self._deferred_ordering -= 1
+            if not self._deferred_ordering:
+                for layer in self._layers.values():
+                    layer._sort()
+
     @property
     def attrib(self):
         return self._attrib
@@ -1109,6 +1259,36 @@ class Passage:
         # Currently no work is done in the Passage level
         edge.parent.layer._add_edge(edge)
 
+    @ModifyPassage
+    def _add_edges(self, edges):
+        """Adds several new :class:`Edge` objects to the :class:`Passage` at once.
+
+        Equivalent to adding each Edge through :meth:`Node.add_multiple`, but
+        the Edge lists of each :class:`Node` are sorted only once, and each
+        :class:`Layer` is updated only once.
+
+        :param edges: Edge objects whose categories are already set, but which
+                were not yet added to their parent and child
+
+        """
+        by_layer = {}
+        for edge in edges:
+            edge.parent._outgoing.append(edge)
+            edge.child._incoming.append(edge)
+            by_layer.setdefault(edge.parent.ID.split(Node.ID_SEPARATOR)[0], []).append(edge)
+            for category in edge.categories:
+                if category.tag not in self._categories:
+                    self._update_categories(category)
+                if category.parent and category.parent not in self._refined_categories:
+                    self._update_refined_categories(category.parent)
+        for node in self._nodes.values():  # sorting is stable, so untouched lists stay the same
+            if len(node._outgoing) > 1:
+                node._outgoing.sort(key=node._orderkey)
+            if len(node._incoming) > 1:
+                node._incoming.sort(key=node._orderkey)
+        for layer_id, layer_edges in by_layer.items():
+            self._layers[layer_id]._add_edges(layer_edges)
+
     def _remove_edge(self, edge):
         """Removes a :class:`Edge` object from :class:`Passage`.
 
@@ -0,0 +1,278 @@
+"""Columnar binary container for whole corpora of UCCA passages.
+
+A corpus file stores many :class:`core.Passage` objects in one file, each as a
+self-contained record of integer columns (node IDs and tags, terminal texts,
+edge parents/children, edge categories and attribute references) followed by
+the string table they index into. Attributes and extra data are stored as
+JSON strings, like in the standard XML format.
+
+The file is read through ``mmap``, and a record is only decoded when its
+passage is requested, so loading one passage never touches the bytes of the
+others::
+
+    write_corpus(passages, "train.ucb")
+    with CorpusFile("train.ucb") as corpus:
+        passage = corpus[812]
+
+File layout (all integers are little-endian)::
+
+    header:  magic, version, number of passages N, uint64 offset of the index
+    record:  7 int32 counts and passage attributes (see _RECORD_HEADER)
+             int32 columns of strings, layers, nodes, edges and categories
+             the UTF-8 encoded string table
+    index:   N+1 uint64 record offsets
+             N+1 uint32 ID offsets, followed by the UTF-8 encoded passage IDs
+
+The index follows the records so that they can be written one at a time.
+
+"""
+
+import json
+import mmap
+import struct
+import sys
+from array import array
+from itertools import accumulate
+
+from ucca import core
+from ucca.convert import _STANDARD_LAYERS, _STANDARD_NODES
+
+CORPUS_SUFFIX = ".ucb"
+MAGIC = b"UCCACORP"
+VERSION = 1
+
+_HEADER = struct.Struct("<8sIIQ")
+# Counts of strings, layers, nodes, edges and categories, then the passage attributes and extra
+_RECORD_HEADER = 7
+_LAYER_COLUMNS = 3  # ID, attrib, extra
+_NODE_COLUMNS = 5  # ID, tag, text, attrib, extra
+_EDGE_COLUMNS = 4  # parent, child, attrib, extra (plus category offsets)
+_CATEGORY_COLUMNS = 4  # tag, slot, layer, parent
+_NONE = -1  # column value for a missing string or an empty dict
+_LITTLE_ENDIAN = sys.byteorder == "little"
+
+
+class CorpusFormatError(core.UCCAError):
+    """Exception raised when a file is not a valid corpus file."""
+    pass
+
+
+def _int_array(typecode, values):
+    """Returns the little-endian bytes of the given integers."""
+    a = array(typecode, values)
+    if not _LITTLE_ENDIAN:
+        a.byteswap()
+    return a.tobytes()
+
+
+def _int_view(buffer, typecode):
+    """Returns the integers stored in buffer, without copying if possible."""
+    if _LITTLE_ENDIAN:
+        return memoryview(buffer).cast(typecode)
+    a = array(typecode, buffer)
+    a.byteswap()
+    return a
+
+
+class _StringTable:
+    """Interns strings for a record, assigning each a running index."""
+
+    def __init__(self):
+        self.indices = {}
+
+    def add(self, s):
+        if s is None:
+            return _NONE
+        return self.indices.setdefault(s, len(self.indices))
+
+    def add_dict(self, d):
+        return self.add(json.dumps(d)) if d else _NONE
+
+    def encode(self):
+        encoded = [s.encode("utf-8") for s in self.indices]
+        return list(accumulate(map(len, encoded), initial=0)), b"".join(encoded)
+
+
+def _encode_passage(passage):
+    """Encodes a Passage as a self-contained record.
+
+    :param passage: the Passage object to encode
+    :return: bytes of the record
+    """
+    strings = _StringTable()
+    layers = sorted(passage.layers, key=lambda layer: layer.ID)
+    layer_columns, node_columns, edge_columns, category_offsets, category_columns = [], [], [], [0], []
+    nodes = [node for layer in layers for node in layer.all]
+    node_indices = {node.ID: i for i, node in enumerate(nodes)}
+    for layer in layers:
+        layer_columns += (strings.add(layer.ID), strings.add_dict(layer.attrib.copy()), strings.add_dict(layer.extra))
+    for node in nodes:
+        attrib = node.attrib.copy()
+        node_columns += (strings.add(node.ID), strings.add(node.tag), strings.add(attrib.pop("text", None)),
+                         strings.add_dict(attrib), strings.add_dict(node.extra))
+        for edge in node:
+            edge_columns += (node_indices[node.ID], node_indices[edge.child.ID],
+                             strings.add_dict(edge.attrib.copy()), strings.add_dict(edge.extra))
+            for category in edge:
+                category_columns += (strings.add(category.tag), strings.add(category.slot or None),
+                                     strings.add(category.layer or None), strings.add(category.parent or None))
+            category_offsets.append(len(category_columns) // _CATEGORY_COLUMNS)
+    passage_attrib, passage_extra = strings.add_dict(passage.attrib.copy()), strings.add_dict(passage.extra)
+    string_offsets, blob = strings.encode()
+    columns = [len(string_offsets) - 1, len(layers), len(nodes), len(category_offsets) - 1, category_offsets[-1],
+               passage_attrib, passage_extra]
+    columns += string_offsets + layer_columns + node_columns + edge_columns + category_offsets + category_columns
+    return _int_array("i", columns) + blob
+
+
+def _decode_passage(ID, record):
+    """Decodes a Passage from its record.
+
+    :param ID: ID of the Passage
+    :param record: buffer of the record, as written by _encode_passage
+    :return: the Passage object
+    """
+    (num_strings, num_layers, num_nodes, num_edges, num_categories,
+     passage_attrib, passage_extra) = _int_view(record[:4 * _RECORD_HEADER], "i")
+    sizes = (num_strings + 1, num_layers * _LAYER_COLUMNS, num_nodes * _NODE_COLUMNS,
+             num_edges * _EDGE_COLUMNS, num_edges + 1, num_categories * _CATEGORY_COLUMNS)
+    columns = _int_view(record[4 * _RECORD_HEADER:4 * (_RECORD_HEADER + sum(sizes))], "i")
+    string_offsets, layer_columns, node_columns, edge_columns, category_offsets, category_columns = (
+        columns[start:end] for start, end in zip(accumulate(sizes, initial=0), accumulate(sizes)))
+    blob = record[4 * (_RECORD_HEADER + sum(sizes)):]
+    strings = [str(blob[start:end], "utf-8") for start, end in zip(string_offsets, string_offsets[1:])]
+
+    def _string(i):
+        return None if i == _NONE else strings[i]
+
+    def _dict(i):
+        return {} if i == _NONE else json.loads(_string(i))
+
+    passage = core.Passage(ID, attrib=_dict(passage_attrib))
+    passage.extra.update(_dict(passage_extra))
+    with passage.deferred_ordering():
+        created_nodes = {}
+        for layer_id, attrib, extra in zip(*[iter(layer_columns)] * _LAYER_COLUMNS):
+            layer = _STANDARD_LAYERS[_string(layer_id)](passage, attrib=_dict(attrib))
+            layer.extra.update(_dict(extra))
+            # some nodes are created automatically, skip creating them but take their attributes/extra
+            created_nodes.update((x.ID, x) for x in layer.all)
+        nodes = []
+        for node_id, tag, text, attrib, extra in zip(*[iter(node_columns)] * _NODE_COLUMNS):
+            node_id, tag, attrib = _string(node_id), _string(tag), _dict(attrib)
+            if text != _NONE:
+                attrib["text"] = _string(text)
+            node = created_nodes.get(node_id)
+            if node is None:
+                node = _STANDARD_NODES[tag](root=passage, ID=node_id, tag=tag, attrib=attrib)
+            else:
+                node.attrib.update(attrib)
+            node.extra.update(_dict(extra))
+            nodes.append(node)
+        categories = [core.Category(*map(_string, category))
+                      for category in zip(*[iter(category_columns)] * _CATEGORY_COLUMNS)]
+        edges = []
+        for i, (parent, child, attrib, extra) in enumerate(zip(*[iter(edge_columns)] * _EDGE_COLUMNS)):
+            edge = core.Edge(root=passage, parent=nodes[parent], child=nodes[child], attrib=_dict(attrib))
+            edge.categories = categories[category_offsets[i]:category_offsets[i + 1]]
+            edge.extra.update(_dict(extra))
+            edges.append(edge)
+        passage._add_edges(edges)
+    return passage
+
+
+def write_corpus(passages, filename):
+    """Writes passages to a corpus file.
+
+    :param passages: iterable of Passage objects
+    :param filename: file name to write to
+    :return: number of passages written
+    """
+    offsets, ids = [_HEADER.size], []
+    with open(filename, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, 0, 0))  # placeholder until the index offset is known
+        for passage in passages:
+            offsets.append(offsets[-1] + f.write(_encode_passage(passage)))
+            ids.append(str(passage.ID).encode("utf-8"))
+        f.write(_int_array("Q", offsets))
+        f.write(_int_array("I", accumulate(map(len, ids), initial=0)))
+        f.write(b"".join(ids))
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, VERSION, len(ids), offsets[-1]))
+    return len(ids)
+
+
+class CorpusFile:
+    """Read-only sequence of the passages in a corpus file.
+
+    Passages are decoded from the memory-mapped file on access, so each access
+    creates a new Passage object.
+
+    Attributes:
+        filename: the file name of the corpus file
+        ids: the IDs of the passages in the file, in order
+
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, "rb") as f:
+            try:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as e:  # empty file
+                raise CorpusFormatError("Not a corpus file: '%s'" % filename) from e
+        if len(self._mmap) < _HEADER.size:
+            raise CorpusFormatError("Not a corpus file: '%s'" % filename)
+        magic, version, count, start = _HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise CorpusFormatError("Not a corpus file: '%s'" % filename)
+        if version != VERSION:
+            raise CorpusFormatError("Unsupported corpus file version %d: '%s'" % (version, filename))
+        if start + 12 * (count + 1) > len(self._mmap):
+            raise CorpusFormatError("Truncated corpus file: '%s'" % filename)
+        self._offsets = _int_view(self._mmap[start:start + 8 * (count + 1)], "Q")
+        start += 8 * (count + 1)
+        id_offsets = _int_view(self._mmap[start:start + 4 * (count + 1)], "I")
+        start += 4 * (count + 1)
+        ids = self._mmap[start:start + id_offsets[-1]]
+        self.ids = [str(ids[i:j], "utf-8") for i, j in zip(id_offsets, id_offsets[1:])]
+        self._indices = {}
+        for i, ID in enumerate(self.ids):
+            self._indices.setdefault(ID, i)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("Passage index out of range: %d" % i)
+        with memoryview(self._mmap) as view:
+            return _decode_passage(self.ids[i], view[self._offsets[i]:self._offsets[i + 1]])
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def by_id(self, ID):
+        """Returns the (first) Passage whose ID is given.
+
+        :param ID: ID string
+        :return: the Passage object
+        :raise KeyError: if no Passage with this ID is in the file
+        """
+        try:
+            return self[self._indices[ID]]
+        except KeyError as e:
+            raise KeyError("Passage '%s' not found in '%s'" % (ID, self.filename)) from e
+
+    def close(self):
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -12,9 +12,12 @@ v1.4
 from collections import Counter, OrderedDict
 from itertools import groupby
 from operator import attrgetter
+from xml.etree.ElementTree import iterparse
 
-from ucca import layer0, layer1, normalization
-from ucca.constructions import get_by_names, create_passage_yields, PRIMARY, DEFAULT, ALL_EDGES
+from ucca import core, layer0, layer1, normalization
+from ucca.convert import file2passage
+from ucca.ioutil import gen_files, read_files_and_dirs, map_chunks
+from ucca.constructions import get_by_names, create_passage_yields, yield_positions, PRIMARY, DEFAULT, ALL_EDGES
 from ucca.layer1 import EdgeTags, NodeTags
 
 UNLABELED = "unlabeled"
@@ -49,9 +52,18 @@ def move_functions(p1, p2):
             p.layer(layer1.LAYER_ID).heads[0].add(EdgeTags.Function, unit)  # Add to root
 
 
+def copy_for_normalization(passage):
+    """
+    Copy the layers of a passage used in evaluation, so that they can be normalized without changing the passage
+    """
+    copied = passage.copy([layer0.LAYER_ID, layer1.LAYER_ID])
+    copied.frozen = False
+    return copied
+
+
 def get_text(p, positions):
     l0 = p.layer(layer0.LAYER_ID)
-    return [l0.by_position(i).text for i in range(1, len(l0.all) + 1) if i in positions]
+    return [l0.by_position(i).text for i in positions]
 
 
 def print_tags_and_text(p, yield_tags):
@@ -60,7 +72,9 @@ def print_tags_and_text(p, yield_tags):
         for y, tags in construction_yield_tags.items():
             if construction.criterion is None:  # category from reference yield tags
                 tags = list(tags) + [construction.name]
-            text_to_tags.setdefault((min(y or [-1]), -max(y or [-1]), " ".join(get_text(p, y))), []).extend(tags)
+            positions = yield_positions(y)
+            text_to_tags.setdefault((min(positions or [-1]), -max(positions or [-1]), " ".join(get_text(p, positions))),
+                                    []).extend(tags)
     for (_, _, text), tags in sorted(text_to_tags.items()):
         print((",".join(sorted(set(filter(None, tags)))) + ": " + text) if tags else text)
 
@@ -326,10 +340,11 @@ class SummaryStatistics:
 
 
 def evaluate(guessed, ref, converter=None, verbose=False, constructions=DEFAULT,
-             units=False, fscore=True, errors=False, normalize=True, eval_type=None, ref_yield_tags=None, **kwargs):
+             units=False, fscore=True, errors=False, normalize=True, eval_type=None, ref_yield_tags=None,
+             copy_passages=True, **kwargs):
     """
     Compare two passages and return requested diagnostics and scores, possibly printing them too.
-    NOTE: since normalize=True by default, this method is destructive: it modifies the given passages before evaluation.
+    The given passages are left unchanged, unless normalize=True and copy_passages=False.
     :param guessed: Passage object to evaluate
     :param ref: reference Passage object to compare to
     :param converter: optional function to apply to passages before evaluation
@@ -338,22 +353,116 @@ def evaluate(guessed, ref, converter=None, verbose=False, constructions=DEFAULT,
     :param units: whether to evaluate common units
     :param fscore: whether to compute precision, recall and f1 score
     :param errors: whether to print the mistakes
-    :param normalize: flatten centers and move common functions to root before evaluation - modifies passages
+    :param normalize: flatten centers and move common functions to root before evaluation
     :param eval_type: specific evaluation type(s) to limit to
     :param ref_yield_tags: reference passage for fine-grained evaluation
+    :param copy_passages: normalize copies of the passages rather than the given ones (frozen ones are always
+                          copied); set to False to save the copying if the passages are not used again
     :return: Scores object
     """
     del kwargs
+    return _evaluate(Evaluator(verbose, constructions, units, fscore, errors), guessed, ref, converter=converter,
+                     normalize=normalize, eval_type=eval_type, ref_yield_tags=ref_yield_tags,
+                     copy_passages=copy_passages)
+
+
+def _evaluate(evaluator, guessed, ref, converter=None, normalize=True, eval_type=None, ref_yield_tags=None,
+              copy_passages=True):
     if converter is not None:
         guessed = converter(guessed)
         ref = converter(ref)
-    if normalize:  # FIXME clone passages to avoid modifying the original ones
+    if normalize:  # FIXME normalize a read-only view of the passages instead of copying them
+        guessed, ref = (copy_for_normalization(p) if copy_passages or p.frozen else p for p in (guessed, ref))
         for passage in (guessed, ref):
             normalization.normalize(passage)  # flatten Cs inside Cs
         move_functions(guessed, ref)  # move common Fs to be under the root, FIXME should be before normalize
 
     if isinstance(eval_type, str):
         eval_type = [eval_type]
-    evaluator = Evaluator(verbose, constructions, units, fscore, errors)
     return Scores((evaluation_type, evaluator.get_scores(guessed, ref, evaluation_type, r=ref_yield_tags))
                   for evaluation_type in (eval_type or EVAL_TYPES))
+
+
+DEFAULT_CHUNK_SIZE = 16
+
+
+def evaluate_corpus(guessed, ref, processes=None, chunk_size=DEFAULT_CHUNK_SIZE, verbose=False, constructions=DEFAULT,
+                    units=False, fscore=True, errors=False, **kwargs):
+    """
+    Compare two collections of passages, matched by passage ID, and return the scores aggregated over all of them.
+    Passage pairs are evaluated in parallel by worker processes, and their scores are aggregated as they arrive.
+    XML files are only read by the worker evaluating them; other files are read here and sent to the workers.
+    Reference passages from other files are read one at a time, but all guessed passages that are not in XML files
+    are read up front and kept in memory until the evaluation is done, so that they can be matched by ID.
+    A reference passage with no guessed passage is evaluated against a passage with no units, and a guessed passage
+    with no reference passage is ignored.
+    :param guessed: Passage objects and/or files and directories of passages to evaluate
+    :param ref: reference Passage objects and/or files and directories of passages to compare to
+    :param processes: number of worker processes (default: number of CPUs; 1 to evaluate in this process)
+    :param chunk_size: number of passage pairs to send to a worker process at a time
+    :param verbose: whether to print the results for each passage
+    :param constructions: names of construction types to include in the evaluation
+    :param units: whether to evaluate common units
+    :param fscore: whether to compute precision, recall and f1 score
+    :param errors: whether to print the mistakes
+    :param kwargs: passed to evaluate(): converter, normalize, eval_type, ref_yield_tags, copy_passages
+    :return: Scores object aggregated over all reference passages
+    """
+    evaluator_args = (verbose, constructions, units, fscore, errors)
+    guessed = dict(_passages_by_id(guessed))
+    pairs = ((guessed.get(ID), r) for ID, r in _passages_by_id(ref))
+    total = None
+    for scores in map_chunks(_evaluate_chunk, pairs, evaluator_args, kwargs, chunk_size=chunk_size,
+                             processes=processes):
+        total = scores if total is None else Scores.aggregate((total, scores))
+    return total or Scores(())
+
+
+def _passages_by_id(passages):
+    """
+    :param passages: Passage objects and/or files and directories of passages
+    :return: generator of (passage ID, Passage object or XML file name) pairs
+    """
+    for item in [passages] if isinstance(passages, str) else passages:
+        if isinstance(item, str):
+            for filename in gen_files(item):
+                if filename.endswith(".xml"):
+                    yield _xml_passage_id(filename), filename
+                else:
+                    for passage in read_files_and_dirs(filename):
+                        yield passage.ID, passage
+        else:
+            yield item.ID, item
+
+
+def _xml_passage_id(filename):
+    """
+    :param filename: standard XML file name
+    :return: ID of the passage in the file, read from the root element only
+    """
+    with open(filename, "rb") as f:  # closed here, although the iterator is dropped after the first element
+        for _, elem in iterparse(f, events=("start",)):
+            return elem.get("passageID")
+
+
+def _evaluate_chunk(pairs, evaluator_args, kwargs):
+    """
+    :param pairs: list of (guessed, reference) pairs, each a Passage object or XML file name (guessed may be None)
+    :param evaluator_args: arguments to create the Evaluator with
+    :param kwargs: passed to _evaluate()
+    :return: Scores object aggregated over the pairs
+    """
+    evaluator = Evaluator(*evaluator_args)
+    total = None
+    for g, r in pairs:
+        # Passages read here are not used again, so there is no need to copy them before normalizing
+        read_here = isinstance(r, str) and not isinstance(g, core.Passage)
+        r = file2passage(r) if isinstance(r, str) else r
+        if g is None:
+            g = r.copy([layer0.LAYER_ID])
+            layer1.Layer1(g)
+        elif isinstance(g, str):
+            g = file2passage(g)
+        scores = _evaluate(evaluator, g, r, **(dict(kwargs, copy_passages=False) if read_here else kwargs))
+        total = scores if total is None else Scores.aggregate((total, scores))
+    return total
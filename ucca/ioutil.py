@@ -1,21 +1,115 @@
 """Input/output utility functions for UCCA scripts."""
+import hashlib
 import os
 import sys
+import tempfile
+import threading
 import time
-from collections import defaultdict
+from collections import defaultdict, deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from glob import glob
-from itertools import filterfalse, chain
+from itertools import filterfalse, chain, islice
 from xml.etree.ElementTree import ParseError
 
-from tqdm import tqdm
-
-from ucca.convert import file2passage, passage2file, from_text, to_text, split2segments
+from ucca.convert import file2passage, pickle2passage, passage2file, from_text, to_text, split2segments
 from ucca.core import Passage
+from ucca.corpus import CorpusFile, CORPUS_SUFFIX
 
 DEFAULT_LANG = "en"
 DEFAULT_ATTEMPTS = 3
 DEFAULT_DELAY = 5
+DEFAULT_PREFETCH = 4
+
+
+class PassageCache:
+    """
+    LRU cache of Passage objects read from files, keyed on path, modification time and size of each file,
+    so a file that changes is read again.
+    Cached Passage objects are shared by all readers of the same file, so they should not be modified.
+    """
+    def __init__(self, max_entries=None, max_bytes=None, cache_dir=None):
+        """
+        :param max_entries: maximum number of passages to keep in memory (None for no limit)
+        :param max_bytes: maximum total size on disk of the files whose passages are kept in memory (None for no
+                          limit); this is not the memory taken by the Passage objects, which is usually larger
+        :param cache_dir: directory to also store parsed passages in, to be reused by other processes and runs
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.hits = self.misses = 0
+        self._entries = OrderedDict()  # key -> (passage, size), least recently used first
+        self._bytes = 0
+        self._lock = threading.Lock()  # passages may be read by several threads
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def get(self, file, load=file2passage):
+        """
+        :param file: file name to read the passage from
+        :param load: function to read the passage with if it is not in the cache
+        :return: Passage object read from the file
+        """
+        stat = os.stat(file)
+        key = (os.path.abspath(file), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry[0]
+            self.misses += 1
+        passage = None
+        cache_file = self._cache_file(key)
+        if cache_file is not None and os.path.exists(cache_file):
+            try:
+                passage = pickle2passage(cache_file)
+            except Exception:  # Corrupt or incompatible, so read again and overwrite it
+                pass
+        if passage is None:
+            passage = load(file)
+            if cache_file is not None:
+                self._write_cache_file(passage, cache_file)
+        with self._lock:
+            self._add(key, passage, stat.st_size)
+        return passage
+
+    def _cache_file(self, key):
+        if self.cache_dir is None:
+            return None
+        digest = hashlib.sha1(repr(key + sys.version_info[:2]).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, digest + ".pickle")
+
+    def _write_cache_file(self, passage, cache_file):
+        # Write to a temporary file first, so that concurrent readers never see a partial file
+        fd, temp_file = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        os.close(fd)
+        try:
+            passage2file(passage, temp_file, binary=True)
+            os.replace(temp_file, cache_file)
+        except Exception:
+            os.remove(temp_file)
+            raise
+
+    def _add(self, key, passage, size):
+        if self.max_entries == 0 or (self.max_bytes is not None and size > self.max_bytes):
+            return
+        self._entries[key] = (passage, size)
+        self._bytes += size
+        while (self.max_entries is not None and len(self._entries) > self.max_entries or
+               self.max_bytes is not None and self._bytes > self.max_bytes):
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+
+    def clear(self):
+        """Removes all passages from memory (but not from the cache directory)."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
 
 
 class LazyLoadedPassages:
@@ -23,7 +117,7 @@ class LazyLoadedPassages:
     Iterable interface to Passage objects that loads files on-the-go and can be iterated more than once
     """
     def __init__(self, files, sentences=False, paragraphs=False, converters=None, lang=DEFAULT_LANG,
-                 attempts=DEFAULT_ATTEMPTS, delay=DEFAULT_DELAY):
+                 attempts=DEFAULT_ATTEMPTS, delay=DEFAULT_DELAY, cache=None):
         self.files = files
         self.sentences = sentences
         self.paragraphs = paragraphs
@@ -32,16 +126,43 @@ class LazyLoadedPassages:
         self.lang = lang
         self.attempts = attempts
         self.delay = delay
+        self.cache = cache
         self._files_iter = None
         self._split_iter = None
         self._file_handle = None
 
     def __iter__(self):
-        self._files_iter = iter(self.files)
+        # Check all files up front, so that missing ones are reported together and retried after the others
+        found = [isinstance(file, Passage) or os.path.exists(file) for file in self.files]
+        missing = [file for file, exists in zip(self.files, found) if not exists]
+        if missing:
+            with external_write_mode(file=sys.stderr):
+                print("Files not found%s: %s" % (", will check again after reading the others" if self.attempts
+                                                 else "", ", ".join(map(str, missing))), file=sys.stderr)
+        self._files_iter = self._iter_files([file for file, exists in zip(self.files, found) if exists], missing)
         self._split_iter = None
         self._file_handle = None
         return self
 
+    def _iter_files(self, existing, missing):
+        """
+        Yields the existing files, then any missing files that appear within the given number of attempts.
+        Attempt i checks the remaining missing files at least i * delay seconds after the start of the iteration,
+        so reading the other files counts towards the waiting time.
+        """
+        start = time.time()
+        yield from existing
+        attempt = 0
+        while missing and attempt < self.attempts:
+            attempt += 1
+            time.sleep(max(0, start + attempt * self.delay - time.time()))
+            found = [os.path.exists(file) for file in missing]
+            yield from (file for file, exists in zip(missing, found) if exists)
+            missing = [file for file, exists in zip(missing, found) if not exists]
+        if missing and self.attempts:
+            with external_write_mode(file=sys.stderr):
+                print("Files not found, skipping: %s" % ", ".join(map(str, missing)), file=sys.stderr)
+
     def __next__(self):
         while True:
             passage = self._next_passage()
@@ -58,26 +179,22 @@ class LazyLoadedPassages:
             if isinstance(file, Passage):  # Not really a file, but a Passage
                 passage = file
             else:  # A file
-                attempts = self.attempts
-                while not os.path.exists(file):
-                    with external_write_mode(file=sys.stderr):
-                        if attempts == 0:
-                            print("File not found: %s" % file, file=sys.stderr)
-                            return None
-                        print("Failed reading %s, trying %d more times..." % (file, attempts), file=sys.stderr)
-                    time.sleep(self.delay)
-                    attempts -= 1
-                try:
-                    passage = file2passage(file)  # XML or binary format
-                except (IOError, ParseError) as e:  # Failed to read as passage file
-                    base, ext = os.path.splitext(os.path.basename(file))
-                    converter = self.converters.get(ext.lstrip("."))
-                    if converter is None:
-                        raise IOError("Could not read %s file. See error message above. "
-                                      "If this file's format is not %s, try adding '.txt' suffix to read as plain text:"
-                                      " '%s'" % (ext, ext, file)) from e
-                    self._file_handle = open(file, encoding="utf-8")
-                    self._split_iter = iter(converter(chain(self._file_handle, [""]), passage_id=base, lang=self.lang))
+                if os.path.splitext(file)[1] == CORPUS_SUFFIX:  # Many passages, decoded one at a time
+                    self._file_handle = CorpusFile(file)
+                    self._split_iter = iter(self._file_handle)
+                else:
+                    try:
+                        passage = self._read_file(file)  # XML or binary format
+                    except (IOError, ParseError) as e:  # Failed to read as passage file
+                        base, ext = os.path.splitext(os.path.basename(file))
+                        converter = self.converters.get(ext.lstrip("."))
+                        if converter is None:
+                            raise IOError("Could not read %s file. See error message above. "
+                                          "If this file's format is not %s, try adding '.txt' suffix to read as "
+                                          "plain text: '%s'" % (ext, ext, file)) from e
+                        self._file_handle = open(file, encoding="utf-8")
+                        self._split_iter = iter(converter(chain(self._file_handle, [""]), passage_id=base,
+                                                          lang=self.lang))
             if self.split:
                 if self._split_iter is None:
                     self._split_iter = (passage,)
@@ -94,6 +211,9 @@ class LazyLoadedPassages:
                 return None
         return passage
 
+    def _read_file(self, file):
+        return file2passage(file) if self.cache is None else self.cache.get(file)
+
     # The following three methods are implemented to support shuffle;
     # note files are shuffled but there is no shuffling within files, as it would not be efficient.
     # Note also the inconsistency because these access the files while __iter__ accesses individual passages.
@@ -110,12 +230,66 @@ class LazyLoadedPassages:
         return bool(self.files)
 
 
+class PrefetchingLazyLoadedPassages(LazyLoadedPassages):
+    """
+    LazyLoadedPassages that reads the next files on a thread pool while the current passage is being used.
+    Passages are still returned in order, and an error reading a file is raised when its passage is reached.
+    """
+    def __init__(self, *args, prefetch=DEFAULT_PREFETCH, workers=None, **kwargs):
+        """
+        :param prefetch: maximum number of files to read ahead of the current one (at least 1)
+        :param workers: number of threads reading files (by default, as many as prefetch)
+        Other arguments are as in LazyLoadedPassages.
+        """
+        if prefetch < 1:
+            raise ValueError("Number of files to prefetch must be at least 1, but is %d "
+                             "(use LazyLoadedPassages to read without prefetching)" % prefetch)
+        super().__init__(*args, **kwargs)
+        self.prefetch = prefetch
+        self.workers = workers
+        self._future = None
+
+    def __iter__(self):
+        if self._files_iter is not None:  # Stop reading ahead for the previous iteration
+            self._files_iter.close()
+        super().__iter__()
+        self._files_iter = self._prefetch_files(self._files_iter)
+        return self
+
+    def _prefetch_files(self, files):
+        """
+        Yields the given files, while the next ones are read in the background.
+        """
+        pending = deque()  # (file, future) pairs of files read ahead, in order
+        with ThreadPoolExecutor(max_workers=self.workers or self.prefetch) as executor:
+            try:
+                while True:
+                    for file in islice(files, self.prefetch + 1 - len(pending)):
+                        pending.append((file, None if isinstance(file, Passage) or
+                                        os.path.splitext(file)[1] == CORPUS_SUFFIX else
+                                        executor.submit(super()._read_file, file)))
+                    if not pending:
+                        return
+                    file, self._future = pending.popleft()
+                    yield file
+            finally:  # Stopped early, so no need to read the rest
+                self._future = None
+                for _, future in pending:
+                    if future is not None:
+                        future.cancel()
+
+    def _read_file(self, file):
+        future, self._future = self._future, None
+        return super()._read_file(file) if future is None else future.result()
+
+
 def resolve_patterns(filename_patterns):
     for pattern in [filename_patterns] if isinstance(filename_patterns, str) else filename_patterns:
         yield from sorted(glob(pattern)) or [pattern]
 
 
 def get_passages_with_progress_bar(filename_patterns, desc=None, **kwargs):
+    from tqdm import tqdm
     filenames = list(resolve_patterns(filename_patterns))
     t = tqdm(read_files_and_dirs(filenames, **kwargs), desc=desc, unit=" passages", total=len(filenames))
     for passage in t:
@@ -142,19 +316,24 @@ def gen_files(files_and_dirs):
 
 
 def read_files_and_dirs(files_and_dirs, sentences=False, paragraphs=False, converters=None, lang=DEFAULT_LANG,
-                        attempts=DEFAULT_ATTEMPTS, delay=DEFAULT_DELAY):
+                        attempts=DEFAULT_ATTEMPTS, delay=DEFAULT_DELAY, cache=None, prefetch=0):
     """
     :param files_and_dirs: iterable of files and/or directories to look in
     :param sentences: whether to split to sentences
     :param paragraphs: whether to split to paragraphs
     :param converters: dict of input format converters to use based on the file extension
     :param lang: language to use for tokenization model
-    :param attempts: number of times to try reading a file before giving up
-    :param delay: number of seconds to wait before subsequent attempts to read a file
+    :param attempts: number of times to check again for missing files (after reading the others) before giving up
+    :param delay: number of seconds between subsequent checks for missing files
+    :param cache: PassageCache to read passage files through, so that iterating again does not parse them again
+    :param prefetch: number of files to read ahead on background threads (0 to read each file only when reached)
     :return: lazy-loaded passages from all files given, plus any files directly under any directory given
     """
-    return LazyLoadedPassages(list(gen_files(files_and_dirs)), sentences=sentences, paragraphs=paragraphs,
-                              converters=converters, lang=lang, attempts=attempts, delay=delay)
+    kwargs = dict(sentences=sentences, paragraphs=paragraphs, converters=converters, lang=lang, attempts=attempts,
+                  delay=delay, cache=cache)
+    files = list(gen_files(files_and_dirs))
+    return PrefetchingLazyLoadedPassages(files, prefetch=prefetch, **kwargs) if prefetch else \
+        LazyLoadedPassages(files, **kwargs)
 
 
 def write_passage(passage, output_format=None, binary=False, outdir=".", prefix="", converter=None, verbose=True,
@@ -189,8 +368,41 @@ def write_passage(passage, output_format=None, binary=False, outdir=".", prefix=
 
 @contextmanager
 def external_write_mode(*args, **kwargs):
+    tqdm = sys.modules.get("tqdm")  # if tqdm has not been imported, there are no progress bars to write around
     try:
-        with tqdm.external_write_mode(*args, **kwargs):
+        with tqdm.tqdm.external_write_mode(*args, **kwargs):
             yield
     except AttributeError:
         yield
+
+
+def map_chunks(func, iterable, *args, chunk_size=1, processes=None):
+    """
+    Applies a function to consecutive chunks of items in worker processes, keeping only a few chunks in flight
+    :param func: picklable function to call as func(chunk, *args), where chunk is a list of items
+    :param iterable: items to split into chunks, read only as more chunks are needed
+    :param args: more arguments to pass to func
+    :param chunk_size: number of items to send to a worker process at a time
+    :param processes: number of worker processes (default: number of CPUs; 1 to call func in this process)
+    :return: generator of the results of func for each chunk, in the order of the chunks
+    """
+    items = iter(iterable)
+    chunks = iter(lambda: list(islice(items, chunk_size)), [])
+    if processes is None:
+        processes = os.cpu_count()
+    if processes == 1:
+        for chunk in chunks:
+            yield func(chunk, *args)
+        return
+    from concurrent.futures import ProcessPoolExecutor
+    executor = ProcessPoolExecutor(processes)
+    futures = deque()  # submitted only up to 2 chunks per process ahead of the results consumed
+    try:
+        for chunk in chunks:
+            futures.append(executor.submit(func, chunk, *args))
+            if len(futures) >= 2 * processes:
+                yield futures.popleft().result()
+        while futures:
+            yield futures.popleft().result()
+    finally:
+        executor.shutdown(cancel_futures=True)
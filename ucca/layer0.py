@@ -143,10 +143,12 @@ class Layer0(core.Layer):
 
     @property
     def words(self):
+        self._sort()
         return tuple(x for x in self._all if not x.punct)
 
     @property
     def pairs(self):
+        self._sort()
         return tuple(enumerate(self._all, start=1))
 
     def by_position(self, pos):
@@ -156,6 +158,7 @@ class Layer0(core.Layer):
         :return: the Terminal in this position
         :raise IndexError: if the position is out of bounds
         """
+        self._sort()
         return self._all[pos - 1]  # positions start at 1, not 0
 
     def add_terminal(self, text, punct, paragraph=1):
@@ -173,6 +176,7 @@ class Layer0(core.Layer):
         :raise DuplicateIdError: if trying to add an already existing Terminal,
                 caused by un-ordered Terminal positions in the layer
         """
+        self._sort()
         position = len(self._all) + 1  # we want positions to start with 1
         para_pos = self._all[-1].para_pos + 1 if position > 1 and paragraph == self._all[-1].paragraph else 1
         tag = NodeTags.Punct if punct else NodeTags.Word
@@ -190,7 +194,7 @@ class Layer0(core.Layer):
         """
         other = Layer0(root=other_passage, attrib=self.attrib.copy())
         other.extra = self.extra.copy()
-        for t in self._all:
+        for t in self.all:
             copied = other.add_terminal(t.text, t.punct, t.paragraph)
             copied.extra = t.extra.copy()
 
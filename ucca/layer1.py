@@ -178,8 +178,15 @@ class FoundationalNode(core.Node):
             head, which returns None.
         ftag: the tag of the Edge connecting the fparent (as described above)
             with this FNode
+        fdepth: the number of fparents above this FNode (0 for the Passage head)
+        top_level_ancestor: the ancestor of this FNode (through fparents) which
+            is immediately below the Passage head, or this FNode itself if it
+            is the Passage head or immediately below it
         discontiguous: whether this FNode has continuous Terminals or not
 
+    fdepth and top_level_ancestor are read from the primary index of the
+    layer (see :meth:`Layer1.primary_index`).
+
     """
 
     @property
@@ -247,8 +254,20 @@ class FoundationalNode(core.Node):
         return _single_child_by_tag(self, EdgeTags.Relator, False)
 
     def _fedge(self):
-        """Returns the Edge of the fparent, or None."""
-        for edge in self.incoming:
+        """Returns the Edge of the fparent, or None.
+
+        Uses the primary index of the layer if it is up to date, and scans the
+        incoming Edges otherwise.
+        """
+        primary = self._root.layer(LAYER_ID)._primary
+        if primary is not None and primary[0] == self._root._modifications:
+            entry = primary[1].get(self)
+            if entry is not None:
+                return entry[0]
+        return self._find_fedge()
+
+    def _find_fedge(self):
+        for edge in self._incoming:
             if (edge.parent.layer.ID == LAYER_ID and
                 edge.parent.tag == NodeTags.Foundational and
                     not edge.attrib.get('remote')):
@@ -270,6 +289,14 @@ class FoundationalNode(core.Node):
         edge = self._fedge()
         return edge.tags if edge else None
 
+    @property
+    def fdepth(self):
+        return self._root.layer(LAYER_ID).primary_index()[self][1]
+
+    @property
+    def top_level_ancestor(self):
+        return self._root.layer(LAYER_ID).primary_index()[self][2]
+
     def get_terminals(self, punct=True, remotes=False, visited=None):
         """Returns a list of all terminals under the span of this FoundationalNode.
         :param punct: whether to include punctuation Terminals, defaults to True
@@ -278,36 +305,58 @@ class FoundationalNode(core.Node):
         :return: a list of :class:`layer0`.Terminal objects
         """
         if visited is None:
-            return sorted(self.get_terminals(punct=punct, remotes=remotes, visited=set()),
-                          key=operator.attrgetter("position"))
+            return list(self._terminal_span(punct, remotes)[0])
         outgoing = {e for e in set(self) - visited if remotes or not e.attrib.get("remote")}
         return [t for e in outgoing for t in e.child.get_terminals(
             punct=punct, remotes=remotes, visited=visited | outgoing)]
 
+    def get_terminal_positions(self, punct=True, remotes=False):
+        """Returns a sorted tuple of the positions of all terminals under the span of this FoundationalNode.
+        :param punct: whether to include punctuation Terminals, defaults to True
+        :param remotes: whether to include Terminals from remote FoundationalNodes, defaults to false
+        """
+        return self._terminal_span(punct, remotes)[1]
+
+    def _terminal_span(self, punct=True, remotes=False):
+        """Returns a (terminals, positions) pair of tuples sorted by position.
+
+        Spans are cached per node and discarded whenever the Passage is
+        modified, which is detected through its modification counter.
+        """
+        modifications = self._root._modifications
+        cache = self.__dict__.get("_terminal_spans")
+        if cache is None or cache[0] != modifications:
+            cache = self._terminal_spans = (modifications, {})
+        span = cache[1].get((punct, remotes))
+        if span is None:
+            terminals = tuple(sorted(self.get_terminals(punct=punct, remotes=remotes, visited=set()),
+                                     key=operator.attrgetter("position")))
+            span = cache[1][(punct, remotes)] = (terminals, tuple(t.position for t in terminals))
+        return span
+
     @property
     def start_position(self):
         try:
-            return self.get_terminals()[0].position
+            return self.get_terminal_positions()[0]
         except IndexError:  # implicit unit or having no Terminals
             return -1
 
     @property
     def end_position(self):
         try:
-            return self.get_terminals()[-1].position
+            return self.get_terminal_positions()[-1]
         except IndexError:  # implicit unit or having no Terminals
             return -1
 
     @property
     def discontiguous(self):
-        terms = self.get_terminals()
-        return any(terms[i].position + 1 != terms[i + 1].position
-                   for i in range(len(terms) - 1))
+        pos = self.get_terminal_positions()
+        return any(pos[i] + 1 != pos[i + 1] for i in range(len(pos) - 1))
 
     def get_sequences(self):
         if self.attrib.get('implicit'):
             return []
-        pos = sorted([x.position for x in self.get_terminals()])
+        pos = self.get_terminal_positions()
 
         # all terminals which end a sequence, including the last one
         seq_closers = [pos[i] for i in range(len(pos) - 1)
@@ -320,7 +369,7 @@ class FoundationalNode(core.Node):
 
     def to_text(self):
         """Returns the text in the span of self, separated by spaces."""
-        return ' '.join(t.text for t in self.get_terminals())
+        return ' '.join(t.text for t in self._terminal_span()[0])
 
     def is_scene(self):
         return self.state is not None or self.process is not None
@@ -386,6 +435,7 @@ class PunctNode(FoundationalNode):
 
     @property
     def terminals(self):
+        """A new list of the punctuation Terminals, or a shared tuple of them if the Passage is frozen."""
         return self.children
 
     def get_terminals(self, punct=True, *args, **kwargs):
@@ -396,7 +446,7 @@ class PunctNode(FoundationalNode):
         :return: a list of :class:`layer0`.Terminal objects
 
         """
-        return self.children if punct else ()
+        return list(self.children) if punct else ()
 
     def __str__(self):
         return self.to_text()
@@ -407,6 +457,14 @@ class Layer1(core.Layer):
 
     """
 
+    # (modifications counter, index) pair of the last primary index built
+    _primary = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_primary", None)  # computed again when needed
+        return state
+
     def __init__(self, root, attrib=None, *, orderkey=core.id_orderkey):
         super().__init__(ID=LAYER_ID, root=root, attrib=attrib,
                          orderkey=orderkey)
@@ -420,19 +478,19 @@ class Layer1(core.Layer):
 
     @property
     def top_scenes(self):
+        """A new list of the top-level scenes, or a shared tuple of them if the Passage is frozen."""
         return self._scenes[:]
 
     @property
     def top_linkages(self):
+        """A new list of the top-level linkages, or a shared tuple of them if the Passage is frozen."""
         return self._linkages[:]
 
     def next_id(self):
         """Returns the next available ID string for this layer."""
         for n in itertools.count(start=len(self._all) + 1):
             id_str = "{}{}{}".format(LAYER_ID, core.Node.ID_SEPARATOR, n)
-            try:
-                self._root.by_id(id_str)
-            except KeyError:
+            if id_str not in self._root._nodes:
                 return id_str
 
     def add_fnode_multiple(self, parent, edge_categories, *, implicit=False, edge_attrib=None):
@@ -458,6 +516,35 @@ class Layer1(core.Layer):
             parent.add_multiple(edge_categories, fnode, edge_attrib=edge_attrib)
         return fnode
 
+    def copy(self, other_passage):
+        """Creates a copied Layer1 object, with all its nodes and edges, in other_passage.
+
+        Edges are copied to the same children, so layers whose nodes are
+        children of this layer (i.e. Layer0) must already be in other_passage.
+
+        :param other_passage: the Passage to copy self to
+
+        """
+        other = Layer1(root=other_passage, attrib=self.attrib.copy(), orderkey=self._orderkey)
+        other.extra = self.extra.copy()
+        with other_passage.deferred_ordering():
+            for node in self.all:
+                copied = other_passage._nodes.get(node.ID)  # the head node is created with the layer
+                if copied is None:
+                    copied = type(node)(root=other_passage, tag=node.tag, ID=node.ID, attrib=node.attrib.copy())
+                else:
+                    copied.attrib.update(node.attrib.copy())
+                copied.extra = node.extra.copy()
+            edges = []
+            for node in self.all:
+                for edge in node:
+                    copied = core.Edge(root=other_passage, parent=other_passage.by_id(node.ID),
+                                       child=other_passage.by_id(edge.child.ID), attrib=edge.attrib.copy())
+                    copied.categories = [core.Category(c.tag, c.slot, c.layer, c.parent) for c in edge]
+                    copied.extra = edge.extra.copy()
+                    edges.append(copied)
+            other_passage._add_edges(edges)
+
     def add_fnode(self, parent, tag, *, implicit=False):
         return self.add_fnode_multiple(parent, [(tag,)], implicit=implicit)
 
@@ -578,6 +665,15 @@ class Layer1(core.Layer):
         super()._add_edge(edge)
         self._update_edge(edge)
 
+    def _add_edges(self, edges):
+        super()._add_edges(edges)
+        self._scenes = sorted((node for node in self._all
+                               if node.tag == NodeTags.Foundational and self._check_top_scene(node)),
+                              key=self.orderkey)
+        self._linkages = sorted((node for node in self._all if node.tag == NodeTags.Linkage and
+                                 all(fnode in self._scenes for fnode in node.arguments)),
+                                key=self.orderkey)
+
     def _remove_edge(self, edge):
         super()._remove_edge(edge)
         self._update_edge(edge)
@@ -585,3 +681,54 @@ class Layer1(core.Layer):
     def _change_edge_tag(self, edge, old_tag):
         super()._change_edge_tag(edge, old_tag)
         self._update_edge(edge)
+
+    def primary_index(self):
+        """Returns the primary (fparent) structure of all FNodes in the layer.
+
+        The index is computed in one pass over the layer, and is kept until
+        the Passage is modified (which is detected through its modification
+        counter), after which it is computed again on the next call.
+        While it is up to date, fparent, ftag and ftags are read from it
+        rather than by scanning the incoming Edges of the FNode.
+
+        :return: dict mapping each FNode to a (fedge, fdepth, top_level_ancestor)
+                tuple, where fedge is the Edge from its fparent (or None)
+
+        """
+        modifications = self._root._modifications
+        if self._primary is None or self._primary[0] != modifications:
+            fedges = {node: node._find_fedge() for node in self._all if isinstance(node, FoundationalNode)}
+            index = {}
+            for start in fedges:
+                path = []  # FNodes up to an indexed one, the head, or a cycle
+                on_path = set()
+                node = start
+                while node is not None and node not in index and node not in on_path:
+                    path.append(node)
+                    on_path.add(node)
+                    edge = fedges.get(node)
+                    node = edge.parent if edge else None
+                for node in reversed(path):
+                    edge = fedges[node]
+                    parent_entry = index.get(edge.parent) if edge else None
+                    if parent_entry is None:  # no fparent (or a cycle)
+                        index[node] = (edge, 0, node)
+                    else:
+                        _, depth, top = parent_entry
+                        index[node] = (edge, depth + 1, top if depth else node)
+            self._primary = (modifications, index)
+        return self._primary[1]
+
+    def _freeze(self):
+        """Computes the terminal spans and primary index of all FNodes, as they can't change anymore."""
+        super()._freeze()
+        self._scenes, self._linkages = tuple(self._scenes), tuple(self._linkages)
+        self.primary_index()
+        for node in self._all:
+            if isinstance(node, FoundationalNode):
+                node.get_terminal_positions()
+                node.get_terminal_positions(punct=False)
+
+    def _unfreeze(self):
+        super()._unfreeze()
+        self._scenes, self._linkages = list(self._scenes), list(self._linkages)
@@ -2,8 +2,9 @@ from collections import OrderedDict
 
 import pytest
 
-from ucca import textutil
-from ucca.constructions import CATEGORIES_NAME, DEFAULT, CONSTRUCTIONS, extract_candidates
+from ucca import textutil, layer0, layer1
+from ucca.constructions import CATEGORIES_NAME, DEFAULT, CONSTRUCTIONS, extract_candidates, terminal_yields, \
+    positions, yield_positions
 from .conftest import PASSAGES, loaded, loaded_valid, multi_sent, crossing, discontiguous, l1_passage, empty
 
 """Tests the constructions module functions and classes."""
@@ -45,3 +46,35 @@ def test_extract_all(create, expected):
 def test_extract(create, constructions, monkeypatch):
     monkeypatch.setattr(textutil, "get_nlp", assert_spacy_not_loaded)
     extract_and_check(create(), constructions=constructions)
+
+
+@pytest.mark.parametrize("create", PASSAGES)
+def test_terminal_yields(create):
+    p = create()
+    yields = terminal_yields(p)
+    for node in p.layer(layer1.LAYER_ID).all:
+        terminal_yield, terminal_yield_no_punct = yields[node.ID]
+        assert terminal_yield == positions(node.get_terminals())
+        assert terminal_yield_no_punct == positions(node.get_terminals(punct=False))
+        assert yield_positions(terminal_yield) == sorted({t.position for t in node.get_terminals()})
+
+
+@pytest.mark.parametrize("create", PASSAGES)
+def test_candidate_terminals(create):
+    for candidates in extract_candidates(create(), constructions=DEFAULT).values():
+        for candidate in candidates:
+            assert candidate.terminals == candidate.edge.child.get_terminals()
+            assert candidate.terminals is candidate.terminals  # computed once
+            assert not candidate.extra
+
+
+def test_extract_external_annotation(monkeypatch):
+    monkeypatch.setattr(textutil, "get_nlp", assert_spacy_not_loaded)
+    p = l1_passage()
+    l0 = p.layer(layer0.LAYER_ID)
+    for terminal in l0.all:  # annotation with strings rather than spaCy IDs, e.g. taken from a UD treebank
+        l0.doc(terminal.paragraph).append([terminal.text, terminal.text.lower(), "NN", "NOUN"] + 7 * [None])
+    p.extra["annotated"] = True
+    extract_and_check(p, constructions=CONSTRUCTIONS, expected={
+        'P': 2, 'mwe': 4, 'H': 3, 'primary': 11, 'U': 2, 'A': 5, 'D': 1, 'L': 2, 'remote': 2, 'S': 1, 'implicit': 1,
+        'main_rel': 3, 'pred_nouns': 3})
@@ -1,7 +1,11 @@
+import io
+import json
 import xml.etree.ElementTree as ETree
 
+import pytest
+
 from ucca import layer0, layer1, convert, textutil
-from .conftest import loaded, load_xml
+from .conftest import loaded, load_xml, multi_sent, crossing, discontiguous, l1_passage, PASSAGES
 
 """Tests convert module correctness and API."""
 
@@ -165,6 +169,22 @@ def test_from_standard():
     assert passage.equals(ref, ordered=True)
 
 
+@pytest.mark.parametrize("create", PASSAGES)
+def test_from_standard_file(create):
+    passage = create()
+    xml = ETree.tostring(convert.to_standard(passage))
+    ref = convert.from_standard(ETree.fromstring(xml))
+    streamed = convert.from_standard_file(io.BytesIO(xml))
+    assert streamed.equals(ref, ordered=True)
+    for layer in ref.layers:
+        assert [x.ID for x in streamed.layer(layer.ID).all] == [x.ID for x in layer.all]
+        assert [x.ID for x in streamed.layer(layer.ID).heads] == [x.ID for x in layer.heads]
+    assert streamed.categories == ref.categories
+    if layer1.LAYER_ID in (layer.ID for layer in ref.layers):
+        assert streamed.layer(layer1.LAYER_ID).top_scenes == [
+            streamed.by_id(x.ID) for x in ref.layer(layer1.LAYER_ID).top_scenes]
+
+
 def test_from_text():
     sample = ["Hello . again", "nice", " ? ! end", ""]
     passage = next(convert.from_text(sample))
@@ -201,3 +221,50 @@ def test_to_site():
     root = convert.to_site(passage)
     copy = convert.from_site(root)
     assert passage.equals(copy)
+
+
+@pytest.mark.parametrize("create", (multi_sent, crossing, discontiguous, l1_passage))
+def test_to_json(create):
+    passage = create()
+    lines = convert.to_json(passage)
+    d = json.loads("\n".join(lines))
+    assert [t["text"] for t in d["tokens"]] == [t.text for t in passage.layer(layer0.LAYER_ID).all]
+    units = {u["tree_id"]: u for u in d["annotation_units"]}
+    for unit in units.values():
+        assert unit["parent_tree_id"] is None or unit["parent_tree_id"] in units
+        if unit["is_remote_copy"]:
+            assert not units[unit["cloned_from_tree_id"]]["is_remote_copy"]
+
+
+def _json_tasks(passages):
+    names = sorted({category["name"] for passage in passages
+                    for unit in convert.to_json(passage, return_dict=True)["annotation_units"]
+                    for category in unit["categories"]})
+    categories = [dict(id=i, name=name) for i, name in enumerate(names, start=1)]
+    project = dict(layer=dict(name="UCCA", categories=categories, parent=None))
+    return [dict(convert.to_json(passage, return_dict=True, all_categories=categories),
+                 id=i, passage=dict(id=str(i)), project=project) for i, passage in enumerate(passages, start=1)]
+
+
+@pytest.mark.parametrize("array", (False, True), ids=("lines", "array"))
+def test_from_json_file(array):
+    tasks = _json_tasks([multi_sent(), crossing(), discontiguous(), l1_passage()])
+    text = json.dumps(tasks, indent=2) if array else "".join(json.dumps(task) + "\n" for task in tasks)
+    assert list(convert._iter_json_values(io.StringIO(text), read_size=100)) == tasks
+    passages = list(convert.from_json_file(io.StringIO(text)))
+    assert len(passages) == len(tasks)
+    for passage, task in zip(passages, tasks):
+        assert passage.equals(next(convert.from_json(task)), ordered=True)
+
+
+@pytest.mark.parametrize("processes", (1, 2))
+def test_json_file2files(tmpdir, processes):
+    tasks = _json_tasks([multi_sent(), crossing(), discontiguous(), l1_passage()])
+    source = str(tmpdir.join("tasks.jsonl"))
+    with open(source, "w", encoding="utf-8") as f:
+        f.writelines(json.dumps(task) + "\n" for task in tasks)
+    filenames = list(convert.json_file2files(source, outdir=str(tmpdir), processes=processes, chunk_size=3))
+    assert filenames == [str(tmpdir.join(task["passage"]["id"] + ".xml")) for task in tasks]
+    for filename, task in zip(filenames, tasks):
+        expected = convert.from_standard(convert.to_standard(next(convert.from_json(task))))
+        assert convert.file2passage(filename).equals(expected, ordered=True)
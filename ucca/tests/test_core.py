@@ -89,6 +89,41 @@ def test_modifying():
     assert node22[0].tag == "testx"
 
 
+def test_frozen():
+    p = basic()
+    l1, l2 = p.layer("1"), p.layer("2")
+    node11, node12, node13 = l1.all
+    node22, node21 = l2.all
+    p.frozen = True
+    assert l1.all == (node11, node12, node13)
+    assert l1.all is l1.all and l1.heads is l1.heads
+    assert node12.children == (node13, node11) and node12.children is node12.children
+    assert node11.parents == (node12, node21, node22) and node11.parents is node11.parents
+    assert node12.outgoing is node12.outgoing and node11.incoming is node11.incoming
+    with pytest.raises(core.FrozenPassageError):
+        node12.add("test", node13)
+    with pytest.raises(core.FrozenPassageError):
+        node13.attrib["node"] = False
+    for nodes in (l1.all, l1.heads, node12.children, node11.parents):  # shared tuples can't be changed by callers
+        with pytest.raises(AttributeError):
+            nodes.append(node13)
+        with pytest.raises(AttributeError):
+            nodes.sort(key=str)
+        with pytest.raises(TypeError):
+            nodes += [node13]
+        with pytest.raises(TypeError):
+            nodes[0] = node13
+    assert l1.all == (node11, node12, node13) and node12.children == (node13, node11)
+    p.frozen = False
+    node12.remove(node13)
+    assert node12.children == [node11]
+    assert node13.parents == [node22]
+    assert l1.heads == [node12, node13]
+    children = node12.children
+    children.append(node13)  # a new list, which can be changed without changing the Node
+    assert node12.children == [node11]
+
+
 def test_equals():
     p1 = core.Passage("1")
     p2 = core.Passage("2")
@@ -147,6 +182,24 @@ def test_equals():
     assert not (p1.equals(p2) or p2.equals(p1))
 
 
+def test_deferred_ordering():
+    p = core.Passage(ID="1")
+    l1 = core.Layer(ID="1", root=p)
+    with p.deferred_ordering():
+        node13 = core.Node(ID="1.3", root=p, tag="3")
+        node11 = core.Node(ID="1.1", root=p, tag="1")
+        node12 = core.Node(ID="1.2", root=p, tag="2")
+        node12.add("test", node11)
+        assert not l1._ordered
+    assert l1._ordered
+    assert l1.all == [node11, node12, node13]
+    assert l1.heads == [node12, node13]
+    node110 = core.Node(ID="1.10", root=p, tag="10")
+    assert l1._ordered  # appended in order, no need to sort
+    node12.remove(node11)
+    assert l1.heads == [node11, node12, node13, node110]
+
+
 @pytest.mark.parametrize("create", PASSAGES)
 def test_copying(create):
     # we don't need such a complex passage, but it will work anyway
@@ -162,6 +215,13 @@ def test_copying(create):
     p2 = p1.copy([l0id])
     assert (p1.layer(l0id).equals(p2.layer(l0id)))
 
+    l1id = layer1.LAYER_ID
+    p2 = p1.copy([l0id, l1id])
+    assert (p1.layer(l1id).equals(p2.layer(l1id)))
+    assert [n.ID for n in p1.layer(l1id).heads] == [n.ID for n in p2.layer(l1id).heads]
+    p2.layer(l1id).add_fnode(None, layer1.EdgeTags.ParallelScene)
+    assert not p1.layer(l1id).equals(p2.layer(l1id))
+
 
 def test_iteration():
     p = basic()
@@ -177,3 +237,8 @@ def test_iteration():
     assert list(node21.iter(duplicates=True)) == [node21, node11, node12, node13, node11]
     assert list(node21.iter()) == [node21, node11, node12, node13]
     assert list(node22.iter(method="bfs", duplicates=True)) == [node22, node11, node12, node13, node13, node11]
+    assert list(node22.iter(method="bfs")) == [node22, node11, node12, node13]
+    assert [(n, d, e.ID if e else None) for n, d, e in node21.iter(with_depth=True)] == [
+        (node21, 0, None), (node11, 1, "2.1->1.1"), (node12, 1, "2.1->1.2"), (node13, 2, "1.2->1.3")]
+    with pytest.raises(ValueError):
+        next(node21.iter(obj="edges", with_depth=True))
@@ -0,0 +1,51 @@
+import pytest
+
+from ucca import corpus, ioutil, layer1
+from .conftest import PASSAGES
+
+"""Tests the corpus module functions and classes."""
+
+
+@pytest.fixture
+def corpus_file(tmpdir):
+    passages = [create() for create in PASSAGES[2:]]  # the first two are loaded from files
+    filename = str(tmpdir.join("corpus" + corpus.CORPUS_SUFFIX))
+    assert corpus.write_corpus(passages, filename) == len(passages)
+    return passages, filename
+
+
+def test_corpus_file(corpus_file):
+    passages, filename = corpus_file
+    with corpus.CorpusFile(filename) as c:
+        assert len(c) == len(passages)
+        assert c.ids == [p.ID for p in passages]
+        for passage, decoded in zip(passages, c):
+            assert passage.equals(decoded, ordered=True)
+            assert passage.categories == decoded.categories
+            for layer in passage.layers:
+                assert [x.ID for x in layer.all] == [x.ID for x in decoded.layer(layer.ID).all]
+                assert [x.ID for x in layer.heads] == [x.ID for x in decoded.layer(layer.ID).heads]
+                assert layer.extra == decoded.layer(layer.ID).extra
+        l1 = passages[-2].layer(layer1.LAYER_ID)
+        assert [x.ID for x in c[-2].layer(layer1.LAYER_ID).top_scenes] == [x.ID for x in l1.top_scenes]
+        assert c.by_id(passages[0].ID).equals(passages[0])
+        assert len(c[1:3]) == 2
+        with pytest.raises(IndexError):
+            c[len(passages)]
+        with pytest.raises(KeyError):
+            c.by_id("missing")
+
+
+def test_corpus_file_errors(tmpdir):
+    filename = str(tmpdir.join("empty" + corpus.CORPUS_SUFFIX))
+    for content in (b"", b"UCCA", b"not a corpus file at all",
+                    corpus._HEADER.pack(corpus.MAGIC, corpus.VERSION, 5, 1000)):  # truncated before the index
+        with open(filename, "wb") as f:
+            f.write(content)
+        with pytest.raises(corpus.CorpusFormatError):
+            corpus.CorpusFile(filename)
+
+
+def test_read_corpus_file(corpus_file):
+    passages, filename = corpus_file
+    assert [p.ID for p in ioutil.read_files_and_dirs([filename])] == [p.ID for p in passages]
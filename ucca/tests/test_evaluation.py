@@ -6,7 +6,7 @@ from itertools import repeat
 import pytest
 
 from ucca import core, layer0, layer1, convert
-from ucca.evaluation import evaluate, LABELED, UNLABELED, WEAK_LABELED
+from ucca.evaluation import evaluate, evaluate_corpus, Scores, LABELED, UNLABELED, WEAK_LABELED
 from ucca.validation import validate
 from .conftest import PASSAGES, load_xml
 
@@ -334,3 +334,33 @@ def test_evaluate(create1, create2, f1, units=False, errors=False):
         if not before:
             assert not after
     check_primary_remote(scores, f1)
+
+
+@pytest.mark.parametrize("processes", (1, 2))
+def test_evaluate_corpus(processes):
+    scores = evaluate_corpus([passage2(), passage1()], [passage1(), passage2()], processes=processes, chunk_size=1)
+    assert 1.0 == scores.average_f1()
+    check_primary_remote(scores, 1.0)
+    scores = evaluate_corpus([function1()], [simple1(), passage2()], processes=processes)  # no guess for passage2
+    missing = passage2()
+    empty = missing.copy([layer0.LAYER_ID])
+    layer1.Layer1(empty)
+    expected = Scores.aggregate([evaluate(function1(), simple1()), evaluate(empty, missing)])
+    for eval_type in expected.evaluators:
+        assert scores.fields(eval_type, counts=True) == expected.fields(eval_type, counts=True)
+
+
+@pytest.mark.parametrize("create1, create2", ((passage1, passage2), (simple1, simple2), (function1, function2)))
+def test_evaluate_unchanged(create1, create2):
+    p1 = create1()
+    p2 = create2()
+    snapshots = [convert.from_standard(convert.to_standard(p)) for p in (p1, p2)]
+    scores = evaluate(p1, p2)
+    assert p1.equals(snapshots[0])
+    assert p2.equals(snapshots[1])
+    p2.frozen = True
+    evaluate(p1, p2, copy_passages=False)  # frozen passages are normalized on a copy
+    assert p2.equals(snapshots[1])
+    for eval_type in scores.evaluators:  # normalizing in place gives the same scores
+        assert evaluate(create1(), create2(), copy_passages=False).fields(eval_type, counts=True) == \
+            scores.fields(eval_type, counts=True)
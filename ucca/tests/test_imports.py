@@ -0,0 +1,24 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+"""Tests that importing the package modules does not load heavy dependencies, which are only needed by some functions."""
+
+HEAVY_MODULES = ("spacy", "numpy", "tqdm", "matplotlib", "networkx")
+MODULES = ("core", "layer0", "layer1", "convert", "corpus", "ioutil", "textutil", "normalization", "constructions",
+           "evaluation", "validation", "visualization", "diffutil")
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.mark.parametrize("module", MODULES)
+def test_import_time(module):
+    out = subprocess.check_output([sys.executable, "-c", """
+import sys, time
+started = time.perf_counter()
+import ucca.%s
+print("%%.3f" %% (time.perf_counter() - started), *sorted(m for m in %r if m in sys.modules))
+""" % (module, HEAVY_MODULES)], cwd=ROOT, universal_newlines=True)
+    elapsed, *loaded = out.split()
+    assert not loaded, "Importing ucca.%s (%ss) loaded %s" % (module, elapsed, ", ".join(loaded))
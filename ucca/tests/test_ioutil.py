@@ -1,10 +1,11 @@
 import os
 import pytest
 import random
+import time
 from glob import glob
 
 from ucca import layer0, layer1, convert, ioutil, diffutil
-from .conftest import loaded, multi_sent, discontiguous, l1_passage
+from .conftest import loaded, multi_sent, discontiguous, l1_passage, crossing
 
 """Tests the ioutil module functions and classes."""
 
@@ -88,3 +89,74 @@ def test_shuffle_passages():
     random.shuffle(passages)
     assert len(files) == len(passages)
     _test_passages(passages)
+
+
+def test_passage_cache(tmpdir):
+    """Test caching passages read from files, in memory and on disk"""
+    files = [str(tmpdir.join("%d.xml" % i)) for i in range(3)]
+    for file, create in zip(files, (multi_sent, discontiguous, l1_passage)):
+        convert.passage2file(create(), file)
+    cache = ioutil.PassageCache(max_entries=2, cache_dir=str(tmpdir.join("cache")))
+    passages = ioutil.read_files_and_dirs(files, cache=cache)
+    first = list(passages)
+    assert (cache.misses, cache.hits, len(cache)) == (3, 0, 2)
+    assert cache.get(files[2]) is first[2]  # still in memory
+    assert cache.hits == 1
+    assert cache.get(files[0]) is not first[0]  # evicted, read again from the cache directory
+    assert cache.get(files[0]).equals(first[0])
+    assert (cache.misses, cache.hits, len(cache)) == (4, 2, 2)
+
+    def _fail(file):
+        raise AssertionError("Should be read from the cache directory: " + file)
+
+    cache = ioutil.PassageCache(max_bytes=0, cache_dir=str(tmpdir.join("cache")))
+    assert all(cache.get(file, load=_fail).equals(p) for file, p in zip(files, first))
+    assert len(cache) == 0
+    stat = os.stat(files[0])
+    convert.passage2file(l1_passage(), files[0])
+    os.utime(files[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert cache.get(files[0]).equals(l1_passage())
+
+
+def test_missing_files(tmpdir):
+    """Test that missing files are checked again only after reading the others"""
+    files = [str(tmpdir.join("%d.xml" % i)) for i in range(3)]
+    convert.passage2file(multi_sent(), files[0])
+    convert.passage2file(l1_passage(), files[2])
+    start = time.time()
+    assert len(list(ioutil.read_files_and_dirs(files, attempts=0, delay=10))) == 2
+    assert time.time() - start < 10
+    passages = iter(ioutil.read_files_and_dirs(files, attempts=2, delay=0.1))
+    assert next(passages).ID == multi_sent().ID
+    convert.passage2file(discontiguous(), files[1])  # appears while reading the others
+    assert str(next(passages)) == str(l1_passage())
+    assert str(next(passages)) == str(discontiguous())
+    with pytest.raises(StopIteration):
+        next(passages)
+
+
+def test_prefetch_passages(tmpdir):
+    """Test reading passages ahead in the background, in order and with errors at the right position"""
+    creates = (multi_sent, discontiguous, l1_passage, crossing)
+    files = [str(tmpdir.join("%d.xml" % i)) for i in range(len(creates))]
+    for file, create in zip(files, creates):
+        convert.passage2file(create(), file)
+    passages = ioutil.read_files_and_dirs(files, prefetch=2)
+    assert isinstance(passages, ioutil.PrefetchingLazyLoadedPassages)
+    for _ in range(2):
+        assert [str(p) for p in passages] == [str(create()) for create in creates]
+    with open(files[2], "w") as f:
+        f.write("<root>")
+    passages = iter(ioutil.read_files_and_dirs(files, prefetch=3, converters={}))
+    assert str(next(passages)) == str(multi_sent())
+    assert str(next(passages)) == str(discontiguous())
+    with pytest.raises(IOError):
+        next(passages)
+    with pytest.raises(ValueError):
+        ioutil.PrefetchingLazyLoadedPassages(files, prefetch=0)
+
+
+@pytest.mark.parametrize("processes", (1, 2))
+def test_map_chunks(processes):
+    """Tests that chunks are mapped in order, with the extra arguments"""
+    assert list(ioutil.map_chunks(sum, range(10), 100, chunk_size=3, processes=processes)) == [103, 112, 121, 109]
@@ -1,3 +1,5 @@
+import pytest
+
 from ucca import layer1
 from .conftest import l1_passage, discontiguous
 
@@ -135,3 +137,59 @@ def test_discontiguous():
     assert ps3.get_sequences() == [(15, 17)]
     assert a3.get_sequences() == [(16, 17)]
     assert not p3.get_sequences()
+
+
+def test_terminal_spans():
+    """Tests that cached terminal spans follow modifications of the passage"""
+    p = l1_passage()
+    l0 = p.layer("0")
+    l1 = p.layer("1")
+    head = l1.heads[0]
+    link1, ps1, ps2, link2, ps3, punct2 = head.children
+
+    assert ps1.get_terminal_positions() == tuple(range(2, 11))
+    assert ps1.get_terminal_positions(punct=False, remotes=True) == tuple(range(2, 10)) + (15,)
+    terminal = l0.add_terminal("new", punct=False)
+    d = l1.add_fnode(ps1, layer1.EdgeTags.Adverbial)
+    d.add(layer1.EdgeTags.Terminal, terminal)
+    assert ps1.end_position == terminal.position
+    assert ps1.discontiguous
+    ps1.remove(d)
+    assert ps1.end_position == 10
+    assert not ps1.discontiguous
+
+    p.frozen = True
+    assert ps1._terminal_spans[0] == p._modifications
+    assert ps1.get_terminals() == list(l0.all[1:10])  # frozen layers hold tuples
+    l1 = p.layer(layer1.LAYER_ID)
+    for nodes in (l1.top_scenes, l1.top_linkages, l1.heads, ps1.children):
+        assert isinstance(nodes, tuple)
+        with pytest.raises(AttributeError):
+            nodes.append(ps1)
+
+
+def test_primary_index():
+    """Tests that the primary index agrees with the fparents and follows modifications of the passage"""
+    p = l1_passage()
+    l1 = p.layer("1")
+    head = l1.heads[0]
+    link1, ps1, ps2, link2, ps3, punct2 = head.children
+    p1, a1, punct1 = [x.child for x in ps1 if not x.attrib.get("remote")]
+
+    index = l1.primary_index()
+    assert set(index) == {x for x in l1.all if isinstance(x, layer1.FoundationalNode)}
+    for node, (fedge, depth, top) in index.items():
+        assert (fedge.parent if fedge else None) == node.fparent
+        assert depth == (node.fparent.fdepth + 1 if node.fparent else 0)
+    assert (head.fdepth, ps1.fdepth, a1.fdepth) == (0, 1, 2)
+    assert head.top_level_ancestor == head
+    assert ps1.top_level_ancestor == ps1
+    assert a1.top_level_ancestor == ps1
+
+    d = l1.add_fnode(a1, layer1.EdgeTags.Adverbial)
+    assert d.fparent == a1 and d.ftag == layer1.EdgeTags.Adverbial
+    assert d.fdepth == 3 and d.top_level_ancestor == ps1
+    ps1.remove(a1)
+    ps2.add(layer1.EdgeTags.Participant, a1)
+    assert a1.fparent == ps2
+    assert d.top_level_ancestor == ps2
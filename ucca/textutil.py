@@ -9,9 +9,6 @@ from enum import Enum
 from itertools import groupby, islice
 from operator import attrgetter, itemgetter
 
-import numpy as np
-from tqdm import tqdm
-
 from ucca import layer0, layer1
 
 MODEL_ENV_VAR = "SPACY_MODEL"  # Determines the default spaCy model to load
@@ -40,7 +37,8 @@ class Attr(Enum):
         if value is None:
             return None
         if self in (Attr.ENT_IOB, Attr.HEAD):
-            return int(np.int64(value))
+            value = int(value)  # spaCy stores negative values as unsigned 64-bit integers
+            return value - 2 ** 64 if value >= 2 ** 63 else value
         if as_array:
             is_str = isinstance(value, str)
             if is_str or self in (Attr.ORTH, Attr.LEMMA):
@@ -51,6 +49,8 @@ class Attr(Enum):
                 except KeyError:
                     value = None
             return value if value is None or isinstance(value, str) else int(value)
+        if isinstance(value, str):  # Already resolved, e.g. taken from an external annotation
+            return value
         try:
             return get_vocab(vocab, lang)[value].text
         except KeyError:
@@ -145,6 +145,7 @@ def get_word_vectors(dim=None, size=None, filename=None, vocab=None):
         return getattr(lex, "orth", lex)
 
     if filename:
+        from tqdm import tqdm
         it = read_word_vectors(dim, size, filename)
         nr_row, nr_dim = next(it)
         vectors = OrderedDict(islice(tqdm(((_lookup(w), v) for w, v in it if orig_keys or w in vocab),
@@ -168,6 +169,7 @@ def read_word_vectors(dim, size, filename):
     :param filename: text file to load vectors from
     :return: generator: first element is (#vectors, #dims); and all the rest are (word [string], vector [NumPy array])
     """
+    import numpy as np
     try:
         first_line = True
         nr_row = nr_dim = None
@@ -383,8 +385,9 @@ def indent_xml(xml_as_string):
 
 @contextmanager
 def external_write_mode(*args, **kwargs):
+    tqdm = sys.modules.get("tqdm")  # if tqdm has not been imported, there are no progress bars to write around
     try:
-        with tqdm.external_write_mode(*args, **kwargs):
+        with tqdm.tqdm.external_write_mode(*args, **kwargs):
             yield
     except AttributeError:
         yield